@@ -45,12 +45,27 @@ st.title("Transit Network Analysis Dashboard")
 # Create tabs for different sections
 tab1, tab2, tab3 = st.tabs(["Transit Network Map", "Transportation Network Map", "Network Statistics"])
 
+@st.cache_data(show_spinner=False)
+def _parse_stats(text: str) -> list[tuple[str, list[str]]]:
+    """Split the statistics report into (title, lines) sections"""
+    sections = []
+    for section in text.split('\n\n'):
+        if section.strip():
+            lines = section.strip().split('\n')
+            sections.append((lines[0], [line for line in lines[1:] if line.strip()]))
+    return sections
+
+@st.cache_data(show_spinner=False)
+def _load_html(path: str, mtime: float) -> str:
+    # mtime is only part of the cache key, so regenerating the file invalidates the entry
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
 def load_html_file(file_path):
     try:
         if not file_path.exists():
             raise FileNotFoundError(f"File not found: {file_path}")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return _load_html(str(file_path), file_path.stat().st_mtime)
     except Exception as e:
         st.error(f"Error loading file {file_path.name}: {str(e)}")
         return None
@@ -76,26 +91,20 @@ with tab3:
         if not stats_file.exists():
             raise FileNotFoundError(f"Statistics file not found: {stats_file}")
             
-        with open(stats_file, 'r') as f:
-            stats = f.read()
-        
-        # Split the statistics into sections
-        sections = stats.split('\n\n')
+        with open(stats_file, 'rb') as f:
+            # Hint sequential access so the kernel reads ahead (POSIX only)
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            stats = f.read().decode('utf-8')
         
-        for section in sections:
-            if section.strip():
-                # Extract section title and content
-                lines = section.strip().split('\n')
-                if lines:
-                    # Make the section title into a header
-                    st.subheader(lines[0])
-                    # Create an expander for the content
-                    with st.expander("Show Details", expanded=True):
-                        # Display the rest of the content
-                        for line in lines[1:]:
-                            if line.strip():
-                                st.text(line)
-                st.markdown("---")
+        for title, lines in _parse_stats(stats):
+            # Make the section title into a header
+            st.subheader(title)
+            # Create an expander for the content
+            with st.expander("Show Details", expanded=True):
+                for line in lines:
+                    st.text(line)
+            st.markdown("---")
                 
     except Exception as e:
         st.error(f"Error loading network statistics: {str(e)}")
@@ -1,10 +1,28 @@
 import json
 import networkx as nx
-import matplotlib.pyplot as plt
+# The PNG is only ever written to disk, so it is drawn on an Agg canvas directly rather than
+# switching the pyplot backend for every process that imports this module
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
+import hashlib
 import os
+import sys
+from collections import defaultdict
 import folium
-from math import sqrt
+from folium.plugins import MarkerCluster
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library parser/serializer
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is skipped without pyarrow
+    pa = None
 
 
 """the isolated nodes
@@ -18,421 +36,460 @@ Total isolated nodes: 6 """
 
 def load_json_data(filename):
     """Load and return JSON data from a file"""
+    if orjson is not None:
+        with open(filename, 'rb') as f:
+            return orjson.loads(f.read())
     with open(filename, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def calculate_distance(point1, point2):
-    """Calculate Euclidean distance between two points"""
-    return sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
-
-# Load data
-facilities_path = os.path.join(os.path.dirname(__file__), 'facilities.json')
-road_data_path = os.path.join(os.path.dirname(__file__), 'road_data.json')
-
-facilities_data = load_json_data(facilities_path)
-road_data = load_json_data(road_data_path)
-
-# Create graph
-G = nx.Graph()
-
-# Add neighborhoods
-for node in facilities_data['neighborhoods']:    # Use ID as is for neighborhoods
-    node_id = str(node['ID'])
-    G.add_node(
-        node_id,  # Use ID as is
-        name=node['Name'],
-        type=node['Type'],
-        x_coord=float(node['X_coordinate']),
-        y_coord=float(node['Y_coordinate']),
-        pos=(node['X_coordinate'], node['Y_coordinate']),  # Keep for compatibility
-        node_category='neighborhood'
-    )
-
-# Add facility nodes
-for facility in facilities_data['facilities']:    G.add_node(
-        facility['ID'],
-        name=facility['Name'],
-        type=facility['Type'],
-        x_coord=float(facility['X_coordinate']),
-        y_coord=float(facility['Y_coordinate']),
-        pos=(facility['X_coordinate'], facility['Y_coordinate']),  # Keep for compatibility
-        node_category='facility'
-    )
-
-# Add road edges if they exist in road_data
-if 'edges' in road_data:
-    for edge in road_data['edges']:
-        source = str(edge['FromID']).strip()  # Ensure string and remove whitespace
-        target = str(edge['ToID']).strip()    # Ensure string and remove whitespace
-          # No need to add prefixes, IDs are used as is
-        # Just ensure they are strings
-        source = str(source)
-        target = str(target)
-            
-        # Debug print to check node existence
-        if source not in G.nodes or target not in G.nodes:
-            print(f"Warning: Edge {source}-{target} references non-existent node(s)")
-            continue
-          # Calculate distance based on coordinates
-        source_coords = (G.nodes[source]['x_coord'], G.nodes[source]['y_coord'])
-        target_coords = (G.nodes[target]['x_coord'], G.nodes[target]['y_coord'])
-        distance = calculate_distance(source_coords, target_coords)
-        
-        # Determine road type based on capacity and status
-        road_type = "major_road"  # default type
-        if edge['status'] == 'potential':
-            road_type = "potential_road"
-        elif edge.get('Current_Capacity_vehicles_hour', 0) < 2500:
-            road_type = "minor_road"
-        elif edge.get('Current_Capacity_vehicles_hour', 0) >= 3500:
-            road_type = "highway"
-            
-        G.add_edge(source, target, 
-                  weight=distance,
-                  type=road_type,
-                  status=edge['status'],
-                  capacity=edge.get('Current_Capacity_vehicles_hour', edge.get('Estimated_Capacity_vehicles_hour', 0)),
-                  condition=edge.get('Condition_1_10', 0))
-
-# Set up output directory
-output_dir = os.path.join(os.path.dirname(__file__), '..', 'output', 'graphs')
-os.makedirs(output_dir, exist_ok=True)
-
-# Create interactive map using folium
-cairo_center = [30.05, 31.25]  # Approximate center of Cairo
-m = folium.Map(location=cairo_center, zoom_start=11)
-
-# Add nodes to the map
-for node, data in G.nodes(data=True):
-    # Folium uses lat/lon (y,x) while our data is in (x,y)
-    location = [data['y_coord'], data['x_coord']]
-    
-    # Customize icon based on node category and type
-    if data['node_category'] == 'neighborhood':
-        color = 'blue'
-        prefix = 'fa'
-        icon = 'home'
-    else:  # facility
-        color = 'red'
-        if data['type'] == 'Medical':
-            icon = 'plus'
-        elif data['type'] == 'Education':
-            icon = 'graduation-cap'
-        elif data['type'] == 'Airport':
-            icon = 'plane'
-        elif data['type'] == 'Business':
-            icon = 'building'
-        elif data['type'] == 'Commercial':
-            icon = 'shopping-cart'
-        else:
-            icon = 'star'
-    
-    popup_text = f"""
-    <b>{data['name']}</b><br>
-    Type: {data['type']}<br>
-    Category: {data['node_category']}
-    """
-    
-    folium.Marker(
-        location=location,
-        popup=popup_text,
-        icon=folium.Icon(color=color, icon=icon, prefix=prefix)
-    ).add_to(m)
-
-# Add edges to the map with different colors based on type
-edge_colors = {
-    'highway': 'red',
-    'major_road': 'blue',
-    'minor_road': 'gray',
-    'potential_road': 'green',
-    'facility_connection': 'orange'
-}
 
-for u, v, data in G.edges(data=True):
-    # Convert to lat/lon format using x_coord and y_coord
-    coordinates = [[G.nodes[u]['y_coord'], G.nodes[u]['x_coord']], 
-                  [G.nodes[v]['y_coord'], G.nodes[v]['x_coord']]]
-    
-    road_type = data['type']
-    color = edge_colors.get(road_type, 'gray')
-    weight = 3 if road_type == 'highway' else 2
-    dash_array = '10,10' if road_type == 'potential_road' else None
-    
-    popup_text = f"""
-    Road Type: {road_type}<br>
-    Status: {data.get('status', 'N/A')}<br>
-    Capacity: {data.get('capacity', 'N/A')} vehicles/hour<br>
-    Condition: {data.get('condition', 'N/A')}/10
-    """
-    
-    folium.PolyLine(
-        coordinates,
-        weight=weight,
-        color=color,
-        popup=popup_text,
-        dash_array=dash_array
-    ).add_to(m)
-
-# Save interactive map
-map_path = os.path.join(output_dir, 'transportation_network_interactive.html')
-m.save(map_path)
-
-# Create static visualization with matplotlib
-plt.figure(figsize=(15, 10))
-
-# Get positions from x_coord and y_coord
-positions = {node: (data['x_coord'], data['y_coord']) for node, data in G.nodes(data=True)}
-
-# Print all nodes for debugging
-print("\nAll nodes in graph:")
-for node in G.nodes():
-    print(f"Node {node}: {G.nodes[node]['name']} ({G.nodes[node]['type']})")
-
-# Find isolated nodes
-isolated_nodes = list(nx.isolates(G))
-print("\nIsolated Nodes:")
-for node in isolated_nodes:
-    print(f"Node {node}: {G.nodes[node]['name']} ({G.nodes[node]['type']})")
-
-# Draw neighborhoods
-neighborhood_nodes = [n for n, d in G.nodes(data=True) if d.get('node_category') == 'neighborhood']
-neighborhood_types = {d['type'] for _, d in G.nodes(data=True) if d.get('node_category') == 'neighborhood'}
-neighborhood_colors = plt.cm.Set3(np.linspace(0, 1, len(neighborhood_types)))
-
-# Draw non-isolated neighborhoods
-for ntype, color in zip(neighborhood_types, neighborhood_colors):
-    nodes = [n for n in neighborhood_nodes if G.nodes[n]['type'] == ntype and n not in isolated_nodes]
-    nx.draw_networkx_nodes(G, positions, nodelist=nodes,
-                         node_color=[color], node_size=300,
-                         label=f'Neighborhood ({ntype})')
-
-# Draw isolated neighborhoods with red border
-isolated_neighborhoods = [n for n in neighborhood_nodes if n in isolated_nodes]
-if isolated_neighborhoods:
-    nx.draw_networkx_nodes(G, positions, nodelist=isolated_neighborhoods,
-                          node_color='white', node_size=300,
-                          edgecolors='red', linewidths=2,
-                          label='Isolated Neighborhoods')
-
-# Draw facility nodes by type
-facility_nodes = [n for n, d in G.nodes(data=True) if d.get('node_category') == 'facility']
-facility_types = {d['type'] for _, d in G.nodes(data=True) if d.get('node_category') == 'facility'}
-facility_colors = plt.cm.Paired(np.linspace(0, 1, len(facility_types)))
-
-# Draw non-isolated facilities
-for ftype, color in zip(facility_types, facility_colors):
-    nodes = [n for n in facility_nodes if G.nodes[n]['type'] == ftype and n not in isolated_nodes]
-    nx.draw_networkx_nodes(G, positions, nodelist=nodes,
-                         node_color=[color], node_size=200, node_shape='s',
-                         label=f'Facility ({ftype})')
-
-# Draw isolated facilities with red border
-isolated_facilities = [n for n in facility_nodes if n in isolated_nodes]
-if isolated_facilities:
-    nx.draw_networkx_nodes(G, positions, nodelist=isolated_facilities,
-                          node_color='white', node_size=200, node_shape='s',
-                          edgecolors='red', linewidths=2,
-                          label='Isolated Facilities')
-
-# Draw edges by type
-edge_colors = {
-    'highway': 'red',
-    'major_road': 'blue',
-    'minor_road': 'gray',
-    'potential_road': 'lightgreen',
-    'facility_connection': 'lightblue'
-}
+# Input data and output locations
+DATA_DIR = os.path.dirname(__file__)
+OUTPUT_DIR = os.path.join(DATA_DIR, '..', 'output', 'graphs')
 
-edge_styles = {
-    'highway': 'solid',
-    'major_road': 'solid',
-    'minor_road': 'solid',
-    'potential_road': 'dashed',
-    'facility_connection': 'dotted'
+# Map marker color per facility type (anything else is red); neighborhoods are blue.
+# Markers are canvas circles, which cannot carry icons, so the type is shown by color instead
+FACILITY_COLOR = {
+    'Medical': 'darkred',
+    'Education': 'purple',
+    'Airport': 'black',
+    'Business': 'darkgreen',
+    'Commercial': 'orange'
 }
 
-# Create an interactive map using folium
-cairo_center = [30.05, 31.25]  # Approximate center of Cairo
-m = folium.Map(location=cairo_center, zoom_start=11)
-
-# Add nodes to the map
-for node in G.nodes():
-    data = G.nodes[node]
-    pos = data['pos']
-    # Folium uses lat/lon (y,x) while our data is in (x,y)
-    location = [pos[1], pos[0]]
-    
-    # Customize icon based on node category and type
-    if data['node_category'] == 'neighborhood':
-        icon_color = 'blue'
-        prefix = 'fa'
-        icon = 'building'
-    else:  # facility
-        icon_color = 'red'
-        if data['type'] == 'Medical':
-            icon = 'plus'
-        elif data['type'] == 'Education':
-            icon = 'graduation-cap'
-        elif data['type'] == 'Airport':
-            icon = 'plane'
-        elif data['type'] == 'Business':
-            icon = 'briefcase'
-        elif data['type'] == 'Commercial':
-            icon = 'shopping-cart'
-        else:
-            icon = 'star'
-        prefix = 'fa'
-    
-    # Create popup content
-    popup_content = f"""
-    <div style='min-width: 200px'>
-        <h4>{data['name']}</h4>
-        <b>Type:</b> {data['type']}<br>
-        <b>Category:</b> {data['node_category']}<br>
-        <b>ID:</b> {node}
-    </div>
-    """
-    
-    # Add marker
-    folium.Marker(
-        location=location,
-        popup=folium.Popup(popup_content, max_width=300),
-        icon=folium.Icon(color=icon_color, icon=icon, prefix=prefix),
-        tooltip=data['name']
-    ).add_to(m)
-
-# Add edges (roads) to the map
-for (u, v, data) in G.edges(data=True):
-    # Get coordinates for the edge
-    coordinates = [[G.nodes[u]['y_coord'], G.nodes[u]['x_coord']], 
-                  [G.nodes[v]['y_coord'], G.nodes[v]['x_coord']]]
-    
-    # Set edge color and style based on road type
-    if data['type'] == 'highway':
-        color = 'red'
-        weight = 4
-    elif data['type'] == 'major_road':
-        color = 'blue'
-        weight = 3
-    elif data['type'] == 'minor_road':
-        color = 'gray'
-        weight = 2
-    elif data['type'] == 'potential_road':
-        color = 'green'
-        weight = 2
-        dash_array = '10,10'
-    else:
-        color = 'purple'
-        weight = 1
-    
-    # Create popup content for the road
-    popup_content = f"""
-    <div>
-        <b>Road Type:</b> {data['type']}<br>
-        <b>Status:</b> {data['status']}<br>
-        <b>Capacity:</b> {data['capacity']} vehicles/hour<br>
-        <b>Condition:</b> {data['condition']}/10
-    </div>
-    """
-    
-    # Add the road line to the map
-    folium.PolyLine(
-        coordinates,
-        weight=weight,
-        color=color,
-        popup=popup_content,
-        dash_array='10,10' if data['type'] == 'potential_road' else None,
-        opacity=0.8
-    ).add_to(m)
-
-# Add a layer control
-folium.LayerControl().add_to(m)
-
-# Save the interactive map
-map_path = os.path.join(output_dir, 'transportation_network_interactive.html')
-m.save(map_path)
-
-# Also create the static matplotlib visualization for comparison
-# Draw each type of edge
-for edge_type, color in edge_colors.items():
-    edges = [(u, v) for u, v, d in G.edges(data=True) if d['type'] == edge_type]
-    if edges:
-        nx.draw_networkx_edges(G, positions, 
-                             edgelist=edges, 
-                             edge_color=color,
-                             style=edge_styles[edge_type],
-                             label=edge_type.replace('_', ' ').title(),
-                             width=2 if edge_type == 'highway' else 1)
-
-# Add labels 
-labels = {n: G.nodes[n]['name'] for n in G.nodes()}
-nx.draw_networkx_labels(G, positions, labels=labels, font_size=6)
-
-plt.title('Cairo Transportation Network')
-plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=8)
-plt.axis('off')
-plt.tight_layout()
-
-# Save the plots in different formats
-output_dir = os.path.join(os.path.dirname(__file__), '..', 'output', 'graphs')
-os.makedirs(output_dir, exist_ok=True)
-
-# Save as PNG for web/viewing
-png_path = os.path.join(output_dir, 'transportation_network.png')
-plt.savefig(png_path, bbox_inches='tight', dpi=300)
-
-
-plt.show()
-
-print(f"\nSaved network visualizations to:")
-print(f"PNG: {png_path}")
-
-
-# Print basic statistics
-print("\nNetwork Statistics:")
-print(f"Number of nodes: {G.number_of_nodes()}")
-print(f"Number of edges: {G.number_of_edges()}")
-print(f"Number of neighborhoods: {len(neighborhood_nodes)}")
-print(f"Number of facilities: {len(facility_nodes)}")
-print(f"Number of isolated nodes: {len(isolated_nodes)}")
-print(f"  - Isolated neighborhoods: {len(isolated_neighborhoods)}")
-print(f"  - Isolated facilities: {len(isolated_facilities)}")
-print("\nNeighborhood types:", ', '.join(neighborhood_types))
-print("Facility types:", ', '.join(facility_types))
-
-# Save network data in JSON format
-graph_data = {
-    'nodes': [
-        {
-            'id': n,
-            'name': G.nodes[n]['name'],
-            'type': G.nodes[n]['type'],
-            'category': G.nodes[n]['node_category'],            'x': float(G.nodes[n]['x_coord']),
-            'y': float(G.nodes[n]['y_coord'])
-        }
-        for n in G.nodes()
-    ],
-    'edges': [
-        {
-            'source': u,
-            'target': v,
-            'type': d['type'],
-            'weight': d['weight'],
-            'status': d.get('status', 'N/A'),
-            'capacity': d.get('capacity', 0),
-            'condition': d.get('condition', 0)
-        }
-        for u, v, d in G.edges(data=True)
-    ]
+# Map (color, weight, dash pattern) per road type
+EDGE_STYLE = {
+    'highway': ('red', 3, None),
+    'major_road': ('blue', 2, None),
+    'minor_road': ('gray', 2, None),
+    'potential_road': ('green', 2, '10,10'),
+    'facility_connection': ('orange', 2, None)
 }
 
-# Save as JSON
-json_path = os.path.join(output_dir, 'transportation_network.json')
-with open(json_path, 'w', encoding='utf-8') as f:
-    json.dump(graph_data, f, indent=2)
-
-print(f"\nSaved network data to JSON: {json_path}")
-
-# Save the graph for future use (in GEXF format which is more compatible)
-nx.write_gexf(G, os.path.join(output_dir, 'transportation_network.gexf'))
 
+def build_graph(facilities_path=None, road_data_path=None):
+    """Build the road network graph from the facilities and road data files"""
+    facilities_data = load_json_data(facilities_path or os.path.join(DATA_DIR, 'facilities.json'))
+    road_data = load_json_data(road_data_path or os.path.join(DATA_DIR, 'road_data.json'))
+
+    # Create graph
+    G = nx.Graph()
+
+    # Add neighborhoods (IDs used as is) and facility nodes in one batch
+    nodes = [
+        (str(node['ID']), {
+            'name': node['Name'],
+            'type': node['Type'],
+            'x_coord': float(node['X_coordinate']),
+            'y_coord': float(node['Y_coordinate']),
+            'node_category': 'neighborhood'
+        })
+        for node in facilities_data['neighborhoods']
+    ]
+    nodes += [
+        (facility['ID'], {
+            'name': facility['Name'],
+            'type': facility['Type'],
+            'x_coord': float(facility['X_coordinate']),
+            'y_coord': float(facility['Y_coordinate']),
+            'node_category': 'facility'
+        })
+        for facility in facilities_data['facilities']
+    ]
+    G.add_nodes_from(nodes)
+
+    # Coordinate table indexed by node position, so all edge lengths come from one array op
+    all_nodes = facilities_data['neighborhoods'] + facilities_data['facilities']
+    id_to_idx = {str(n['ID']): i for i, n in enumerate(all_nodes)}
+    coords = np.array([[float(n['X_coordinate']), float(n['Y_coordinate'])] for n in all_nodes])
+
+    # Add road edges if they exist in road_data
+    if 'edges' in road_data:
+        src_ids, dst_ids, edge_attrs = [], [], []
+        for edge in road_data['edges']:
+            source = str(edge['FromID']).strip()  # Ensure string and remove whitespace
+            target = str(edge['ToID']).strip()    # Ensure string and remove whitespace
+
+            # Debug print to check node existence
+            if source not in id_to_idx or target not in id_to_idx:
+                print(f"Warning: Edge {source}-{target} references non-existent node(s)")
+                continue
+
+            # Determine road type based on capacity and status
+            road_type = "major_road"  # default type
+            if edge['status'] == 'potential':
+                road_type = "potential_road"
+            elif edge.get('Current_Capacity_vehicles_hour', 0) < 2500:
+                road_type = "minor_road"
+            elif edge.get('Current_Capacity_vehicles_hour', 0) >= 3500:
+                road_type = "highway"
+
+            src_ids.append(source)
+            dst_ids.append(target)
+            edge_attrs.append({
+                'type': road_type,
+                'status': edge['status'],
+                'capacity': edge.get('Current_Capacity_vehicles_hour', edge.get('Estimated_Capacity_vehicles_hour', 0)),
+                'condition': edge.get('Condition_1_10', 0)
+            })
+
+        # Calculate distances based on coordinates, for every edge at once
+        src_idx = np.fromiter((id_to_idx[n] for n in src_ids), dtype=np.intp, count=len(src_ids))
+        dst_idx = np.fromiter((id_to_idx[n] for n in dst_ids), dtype=np.intp, count=len(dst_ids))
+        distances = np.sqrt(((coords[src_idx] - coords[dst_idx]) ** 2).sum(axis=1))
+
+        G.add_edges_from(zip(src_ids, dst_ids,
+                             ({'weight': w, **attrs} for w, attrs in zip(distances.tolist(), edge_attrs))))
+    else:
+        src_idx = dst_idx = np.empty(0, dtype=np.intp)
+
+    # Degree of every node from the edge endpoint arrays; isolated nodes are the zero-degree ones
+    degree = np.bincount(np.concatenate([src_idx, dst_idx]), minlength=len(all_nodes))
+    node_ids = [str(n['ID']) for n in all_nodes]
+    G.graph['isolated_nodes'] = [node_ids[i] for i in np.flatnonzero(degree == 0)]
+
+    return G
+
+
+def classify_nodes(G):
+    """Find isolated nodes and group neighborhoods/facilities by type"""
+    # build_graph() precomputes isolation from its edge arrays; fall back for other graphs
+    isolated_nodes = G.graph.get('isolated_nodes')
+    if isolated_nodes is None:
+        isolated_nodes = list(nx.isolates(G))
+    isolated_set = set(isolated_nodes)
+
+    # Group nodes by category and type in a single pass
+    by_cat_type = defaultdict(list)
+    for n, d in G.nodes(data=True):
+        by_cat_type[(d.get('node_category'), d['type'])].append(n)
+    neighborhoods_by_type = {t: nodes for (cat, t), nodes in by_cat_type.items() if cat == 'neighborhood'}
+    facilities_by_type = {t: nodes for (cat, t), nodes in by_cat_type.items() if cat == 'facility'}
+
+    neighborhood_nodes = [n for nodes in neighborhoods_by_type.values() for n in nodes]
+    neighborhood_types = list(neighborhoods_by_type)
+    isolated_neighborhoods = [n for n in neighborhood_nodes if n in isolated_set]
+    facility_nodes = [n for nodes in facilities_by_type.values() for n in nodes]
+    facility_types = list(facilities_by_type)
+    isolated_facilities = [n for n in facility_nodes if n in isolated_set]
+
+    return {
+        'isolated_nodes': isolated_nodes,
+        'isolated_set': isolated_set,
+        'by_cat_type': by_cat_type,
+        'neighborhoods_by_type': neighborhoods_by_type,
+        'facilities_by_type': facilities_by_type,
+        'neighborhood_nodes': neighborhood_nodes,
+        'neighborhood_types': neighborhood_types,
+        'isolated_neighborhoods': isolated_neighborhoods,
+        'facility_nodes': facility_nodes,
+        'facility_types': facility_types,
+        'isolated_facilities': isolated_facilities
+    }
+
+
+def render_maps(G, output_dir=OUTPUT_DIR):
+    """Save the interactive folium map, plus the static PNG when BUILD_STATIC_PNG is set"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Create interactive map using folium
+    cairo_center = [30.05, 31.25]  # Approximate center of Cairo
+    # prefer_canvas draws vector layers onto one <canvas> instead of an SVG/DOM element each
+    m = folium.Map(location=cairo_center, zoom_start=11, prefer_canvas=True)
+
+    # Add nodes to the map as one GeoJSON FeatureCollection of circle markers
+    node_features = []
+    for node, data in G.nodes(data=True):
+        # Customize marker color based on node category and type
+        if data['node_category'] == 'neighborhood':
+            color = 'blue'
+        else:  # facility
+            color = FACILITY_COLOR.get(data['type'], 'red')
+
+        node_features.append({
+            'type': 'Feature',
+            # GeoJSON coordinates are [lon, lat], which is our (x, y)
+            'geometry': {'type': 'Point', 'coordinates': [data['x_coord'], data['y_coord']]},
+            'properties': {'name': data['name'], 'type': data['type'], 'category': data['node_category'],
+                           'color': color}
+        })
+
+    # Cluster the node markers so only a handful are painted when zoomed out
+    node_cluster = MarkerCluster(name='Locations').add_to(m)
+    folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': node_features},
+        marker=folium.CircleMarker(radius=6, fill=True, fill_opacity=0.8, weight=2),
+        style_function=lambda feature: {'color': feature['properties']['color'],
+                                        'fillColor': feature['properties']['color']},
+        popup=folium.GeoJsonPopup(fields=['name', 'type', 'category'], aliases=['Name', 'Type', 'Category'])
+    ).add_to(node_cluster)
+
+    # Add edges to the map, one GeoJSON layer of LineString features per road type
+    edge_features = {road_type: [] for road_type in EDGE_STYLE}
+    # Coordinate table built once from the nodes, so each edge endpoint is a list index
+    id_to_idx = {n: i for i, n in enumerate(G)}
+    coord_list = [[d['x_coord'], d['y_coord']] for _, d in G.nodes(data=True)]
+    for u, v, data in G.edges(data=True):
+        edge_features.setdefault(data['type'], []).append({
+            'type': 'Feature',
+            'geometry': {'type': 'LineString',
+                         'coordinates': [coord_list[id_to_idx[u]], coord_list[id_to_idx[v]]]},
+            'properties': {'road_type': data['type'], 'status': data.get('status', 'N/A'),
+                           'capacity': data.get('capacity', 'N/A'), 'condition': data.get('condition', 'N/A')}
+        })
+
+    for road_type, features in edge_features.items():
+        if not features:
+            continue
+        color, weight, dash_array = EDGE_STYLE.get(road_type, ('gray', 2, None))
+        style = {'color': color, 'weight': weight, 'dashArray': dash_array}
+        folium.GeoJson(
+            {'type': 'FeatureCollection', 'features': features},
+            name=road_type.replace('_', ' ').title(),
+            style_function=lambda feature, style=style: style,
+            popup=folium.GeoJsonPopup(fields=['road_type', 'status', 'capacity', 'condition'],
+                                      aliases=['Road Type', 'Status', 'Capacity (vehicles/hour)', 'Condition (1-10)'])
+        ).add_to(m)
+
+    # Add a layer control
+    folium.LayerControl().add_to(m)
+
+    # Save interactive map
+    map_path = os.path.join(output_dir, 'transportation_network_interactive.html')
+    m.save(map_path)
+
+    # Create static visualization with matplotlib (only on request; the app uses the folium map)
+    if os.environ.get('BUILD_STATIC_PNG'):
+        render_static_png(G, output_dir)
+
+    return map_path
+
+
+def render_static_png(G, output_dir=OUTPUT_DIR):
+    """Draw the network with matplotlib and save it as a PNG"""
+    groups = classify_nodes(G)
+    isolated_set = groups['isolated_set']
+    neighborhoods_by_type = groups['neighborhoods_by_type']
+    facilities_by_type = groups['facilities_by_type']
+    neighborhood_types = groups['neighborhood_types']
+    facility_types = groups['facility_types']
+    isolated_neighborhoods = groups['isolated_neighborhoods']
+    isolated_facilities = groups['isolated_facilities']
+
+    # Get positions from x_coord and y_coord, and the name labels, in one pass
+    positions, labels = {}, {}
+    for node, data in G.nodes(data=True):
+        positions[node] = (data['x_coord'], data['y_coord'])
+        labels[node] = data['name']
+
+    fig = Figure(figsize=(15, 10))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+
+    # Draw neighborhoods
+    neighborhood_colors = colormaps['Set3'](np.linspace(0, 1, len(neighborhood_types)))
+
+    # Draw non-isolated neighborhoods
+    for ntype, color in zip(neighborhood_types, neighborhood_colors):
+        nodes = [n for n in neighborhoods_by_type[ntype] if n not in isolated_set]
+        nx.draw_networkx_nodes(G, positions, nodelist=nodes,
+                             node_color=[color], node_size=300,
+                             label=f'Neighborhood ({ntype})', ax=ax)
+
+    # Draw isolated neighborhoods with red border
+    if isolated_neighborhoods:
+        nx.draw_networkx_nodes(G, positions, nodelist=isolated_neighborhoods,
+                              node_color='white', node_size=300,
+                              edgecolors='red', linewidths=2,
+                              label='Isolated Neighborhoods', ax=ax)
+
+    # Draw facility nodes by type
+    facility_colors = colormaps['Paired'](np.linspace(0, 1, len(facility_types)))
+
+    # Draw non-isolated facilities
+    for ftype, color in zip(facility_types, facility_colors):
+        nodes = [n for n in facilities_by_type[ftype] if n not in isolated_set]
+        nx.draw_networkx_nodes(G, positions, nodelist=nodes,
+                             node_color=[color], node_size=200, node_shape='s',
+                             label=f'Facility ({ftype})', ax=ax)
+
+    # Draw isolated facilities with red border
+    if isolated_facilities:
+        nx.draw_networkx_nodes(G, positions, nodelist=isolated_facilities,
+                              node_color='white', node_size=200, node_shape='s',
+                              edgecolors='red', linewidths=2,
+                              label='Isolated Facilities', ax=ax)
+
+    # Draw edges by type
+    edge_colors = {
+        'highway': 'red',
+        'major_road': 'blue',
+        'minor_road': 'gray',
+        'potential_road': 'lightgreen',
+        'facility_connection': 'lightblue'
+    }
+
+    edge_styles = {
+        'highway': 'solid',
+        'major_road': 'solid',
+        'minor_road': 'solid',
+        'potential_road': 'dashed',
+        'facility_connection': 'dotted'
+    }
+
+    # Group the edges by type once, then draw each type
+    edges_by_type = defaultdict(list)
+    for u, v, d in G.edges(data=True):
+        edges_by_type[d['type']].append((u, v))
+
+    for edge_type, color in edge_colors.items():
+        edges = edges_by_type.get(edge_type)
+        if edges:
+            nx.draw_networkx_edges(G, positions, 
+                                 edgelist=edges, 
+                                 edge_color=color,
+                                 style=edge_styles[edge_type],
+                                 label=edge_type.replace('_', ' ').title(),
+                                 width=2 if edge_type == 'highway' else 1, ax=ax)
+
+    # Add labels
+    nx.draw_networkx_labels(G, positions, labels=labels, font_size=6, ax=ax)
+
+    ax.set_title('Cairo Transportation Network')
+    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=8)
+    ax.axis('off')
+    fig.tight_layout()
+
+    # Save as PNG for web/viewing
+    png_path = os.path.join(output_dir, 'transportation_network.png')
+    fig.savefig(png_path, bbox_inches='tight', dpi=100)
+
+    print(f"\nSaved network visualizations to:")
+    print(f"PNG: {png_path}")
+
+    return png_path
+
+
+def print_statistics(G):
+    """Print the node listing and basic network statistics"""
+    # Print all nodes for debugging
+    print("\nAll nodes in graph:")
+    for node in G.nodes():
+        print(f"Node {node}: {G.nodes[node]['name']} ({G.nodes[node]['type']})")
+
+    groups = classify_nodes(G)
+    isolated_nodes = groups['isolated_nodes']
+    print("\nIsolated Nodes:")
+    for node in isolated_nodes:
+        print(f"Node {node}: {G.nodes[node]['name']} ({G.nodes[node]['type']})")
+
+    # Print basic statistics
+    print("\nNetwork Statistics:")
+    print(f"Number of nodes: {G.number_of_nodes()}")
+    print(f"Number of edges: {G.number_of_edges()}")
+    print(f"Number of neighborhoods: {len(groups['neighborhood_nodes'])}")
+    print(f"Number of facilities: {len(groups['facility_nodes'])}")
+    print(f"Number of isolated nodes: {len(isolated_nodes)}")
+    print(f"  - Isolated neighborhoods: {len(groups['isolated_neighborhoods'])}")
+    print(f"  - Isolated facilities: {len(groups['isolated_facilities'])}")
+    print("\nNeighborhood types:", ', '.join(groups['neighborhood_types']))
+    print("Facility types:", ', '.join(groups['facility_types']))
+
+
+def export(G, output_dir=OUTPUT_DIR):
+    """Save the network as JSON, plus node/edge Parquet tables when pyarrow is available"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Save network data in JSON format
+    graph_data = {
+        'nodes': [
+            {
+                'id': n,
+                'name': G.nodes[n]['name'],
+                'type': G.nodes[n]['type'],
+                'category': G.nodes[n]['node_category'],            'x': float(G.nodes[n]['x_coord']),
+                'y': float(G.nodes[n]['y_coord'])
+            }
+            for n in G.nodes()
+        ],
+        'edges': [
+            {
+                'source': u,
+                'target': v,
+                'type': d['type'],
+                'weight': d['weight'],
+                'status': d.get('status', 'N/A'),
+                'capacity': d.get('capacity', 0),
+                'condition': d.get('condition', 0)
+            }
+            for u, v, d in G.edges(data=True)
+        ]
+    }
+
+    # Save as JSON
+    json_path = os.path.join(output_dir, 'transportation_network.json')
+    if orjson is not None:
+        with open(json_path, 'wb') as f:
+            f.write(orjson.dumps(graph_data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(graph_data, f, indent=2)
+
+    print(f"\nSaved network data to JSON: {json_path}")
+
+    # Save columnar node/edge tables for fast reloading (pq.read_table(path).to_pylist())
+    if pa is not None:
+        for table_name in ('nodes', 'edges'):
+            parquet_path = os.path.join(output_dir, f'transportation_network_{table_name}.parquet')
+            pq.write_table(pa.Table.from_pylist(graph_data[table_name]), parquet_path)
+            print(f"Saved network {table_name} to Parquet: {parquet_path}")
+
+
+BUILD_STAMP = '.build_stamp'
+
+def _expected_outputs():
+    outputs = ['transportation_network_interactive.html', 'transportation_network.json']
+    if pa is not None:
+        outputs += ['transportation_network_nodes.parquet', 'transportation_network_edges.parquet']
+    if os.environ.get('BUILD_STATIC_PNG'):
+        outputs.append('transportation_network.png')
+    return outputs
+
+def build_fingerprint():
+    """SHA-256 of the input data, this script and the set of outputs it writes"""
+    digest = hashlib.sha256()
+    for path in (os.path.join(DATA_DIR, 'facilities.json'), os.path.join(DATA_DIR, 'road_data.json'), __file__):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    digest.update('\n'.join(_expected_outputs()).encode())
+    return digest.hexdigest()
+
+def write_build_stamp(output_dir=OUTPUT_DIR):
+    """Record the fingerprint of the inputs the current outputs were built from"""
+    with open(os.path.join(output_dir, BUILD_STAMP), 'w') as f:
+        f.write(build_fingerprint())
+
+def outputs_fresh(output_dir=OUTPUT_DIR):
+    """
+    Return True if every generated file exists and was built from the current input data and script.
+    Content hashes are compared rather than mtimes, which are arbitrary after a git clone or checkout;
+    outputs without a build stamp (e.g. the committed ones) always count as stale.
+    """
+    try:
+        with open(os.path.join(output_dir, BUILD_STAMP)) as f:
+            stamp = f.read().strip()
+    except OSError:
+        return False
+    return stamp == build_fingerprint() and all(
+        os.path.exists(os.path.join(output_dir, name)) for name in _expected_outputs())
+
+
+if __name__ == '__main__':
+    if '--force' not in sys.argv and outputs_fresh():
+        print(f"Outputs in {OUTPUT_DIR} are up to date with the input data; use --force to rebuild")
+    else:
+        G = build_graph()
+        render_maps(G)
+        print_statistics(G)
+        export(G)
+        write_build_stamp()
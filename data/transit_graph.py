@@ -1,302 +1,434 @@
 import json
 import networkx as nx
 import matplotlib.pyplot as plt
+import numpy as np
 import os
-from math import sqrt
+from math import sqrt, radians, sin, cos, asin
 import folium
+from folium.plugins import MarkerCluster
 import datetime
-from collections import defaultdict
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict, Counter
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library parser
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:  # distance kernels stay pure Python
+    njit = None
+
+EARTH_RADIUS_KM = 6371.0
+
+def _dist(x1, y1, x2, y2):
+    return sqrt((x1 - x2) * (x1 - x2) + (y1 - y2) * (y1 - y2))
+
+def _haversine(lat1, lon1, lat2, lon2):
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(a))
+
+if njit is not None:
+    _dist = njit(cache=True, fastmath=True)(_dist)
+    _haversine = njit(cache=True, fastmath=True)(_haversine)
+    # Compile now so the first real call doesn't pay the JIT latency
+    _dist(0.0, 0.0, 1.0, 1.0)
+    _haversine(0.0, 0.0, 1.0, 1.0)
 
 def load_json_data(filename):
     """Load and return JSON data from a file"""
+    if orjson is not None:
+        with open(filename, 'rb') as f:
+            return orjson.loads(f.read())
     with open(filename, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 def calculate_distance(point1, point2):
     """Calculate Euclidean distance between two points"""
-    return sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
+    return _dist(float(point1[0]), float(point1[1]), float(point2[0]), float(point2[1]))
 
-def create_transit_graph():
-    """Create a transit graph with metro lines and bus routes"""
-    # Load transit and facilities data
-    data_dir = os.path.dirname(__file__)
-    transit_path = os.path.join(data_dir, 'transit_data.json')
-    facilities_path = os.path.join(data_dir, 'facilities.json')
-    
-    transit_data = load_json_data(transit_path)
-    facilities_data = load_json_data(facilities_path)
+def haversine_distance(point1, point2):
+    """Calculate great-circle distance in km between two (lon, lat) points, as stored in pos"""
+    return _haversine(float(point1[1]), float(point1[0]), float(point2[1]), float(point2[0]))
+
+def pairwise_distances(points_a, points_b):
+    """Calculate the matrix of Euclidean distances between two sets of (x, y) points"""
+    a = np.asarray(points_a, dtype=float)
+    b = np.asarray(points_b, dtype=float)
+    diff = a[:, None, :] - b[None, :, :]
+    return np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+
+# Input data and output locations
+DATA_DIR = os.path.dirname(__file__)
+GRAPHS_DIR = os.path.join(DATA_DIR, '..', 'output', 'graphs')
+REPORTS_DIR = os.path.join(DATA_DIR, '..', 'output', 'reports')
+GRAPH_CACHE_PATH = os.path.join(DATA_DIR, '.transit_graph.pkl')
+
+# Colors and icons shared by the static and interactive visualizations
+METRO_COLORS = {'M1': 'red', 'M2': 'blue', 'M3': 'green'}
+
+FACILITY_COLORS = {
+    'Residential': 'green', 'Business': 'blue', 'Mixed': 'purple',
+    'Medical': 'red', 'Education': 'orange', 'Airport': 'cyan',
+    'Transit Hub': 'brown', 'Tourism': 'pink', 'Sports': 'gray',
+    'Commercial': 'yellow', 'Other': 'black'
+}
+
+# Font Awesome icon per facility type (anything else gets a star)
+FACILITY_ICONS = {
+    'Medical': 'plus',
+    'Education': 'graduation-cap',
+    'Airport': 'plane',
+    'Business': 'building',
+    'Commercial': 'shopping-cart',
+    'Residential': 'home',
+    'Transit Hub': 'train',
+    'Tourism': 'camera',
+    'Sports': 'futbol-o'
+}
+
+# Popup HTML templates for the interactive map, filled with str.format
+_STATION_POPUP = (
+    "<div style='min-width: 200px'><h4>{name}</h4>"
+    "<b>Type:</b> Transit Station<br>"
+    "<b>Population Served:</b> {population:,}<br>"
+    "<b>ID:</b> {node}</div>"
+)
+_FACILITY_POPUP = (
+    "<div style='min-width: 200px'><h4>{name}</h4>"
+    "<b>Type:</b> {facility_type}<br>"
+    "<b>ID:</b> {node}</div>"
+)
+_METRO_POPUP = "<div><b>Metro Line:</b> {line_id}<br><b>Daily Passengers:</b> {passengers:,}</div>"
+_BUS_POPUP = (
+    "<div><b>Bus Route:</b> {route_id}<br>"
+    "<b>Daily Passengers:</b> {passengers:,}<br>"
+    "<b>Buses Assigned:</b> {buses}</div>"
+)
+
+def create_transit_graph(use_cache=True):
+    """Create a transit graph with metro lines and bus routes
+
+    The built graph is pickled to GRAPH_CACHE_PATH, keyed by the modification times of the
+    input files and this module, and reused while none of them change.
+    """
+    transit_path = os.path.join(DATA_DIR, 'transit_data.json')
+    facilities_path = os.path.join(DATA_DIR, 'facilities.json')
+    key = tuple(os.stat(path).st_mtime_ns for path in (transit_path, facilities_path, __file__))
+
+    if use_cache:
+        try:
+            with open(GRAPH_CACHE_PATH, 'rb') as f:
+                cached_key, G = pickle.load(f)
+            if cached_key == key:
+                return G
+        except Exception:
+            # Missing, truncated or unreadable cache, including one pickled under other networkx/numpy
+            # versions (AttributeError, ImportError): rebuild
+            pass
+
+    G = _build_transit_graph(transit_path, facilities_path)
+
+    if use_cache:
+        # Write to a temporary file first so a concurrent reader never sees a partial pickle
+        tmp_path = f"{GRAPH_CACHE_PATH}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((key, G), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, GRAPH_CACHE_PATH)
+        except OSError as e:
+            print(f"Warning: Could not write transit graph cache: {e}")
+
+    return G
+
+def _build_transit_graph(transit_path, facilities_path):
+    """Build the transit graph from the transit and facilities data files"""
+    # Read and parse both files concurrently (file reads and orjson release the GIL)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        transit_future = executor.submit(load_json_data, transit_path)
+        facilities_future = executor.submit(load_json_data, facilities_path)
+        transit_data, facilities_data = transit_future.result(), facilities_future.result()
     
     # Create directed graph for transit routes
     G = nx.MultiDiGraph()
 
-    # Create a mapping of numerical IDs to neighborhood IDs
-    node_mapping = {}
-    for i, node in enumerate(facilities_data['neighborhoods'], 1):
-        node_id = str(i)  # Transit data uses string numbers as IDs
-        node_mapping[node_id] = node['ID']
-        G.add_node(
-            node_id,  # Use the numeric ID to match transit data
-            name=node['Name'],
-            type='station',
-            population=0,  # We don't have population data in this example
-            pos=(node['X_coordinate'], node['Y_coordinate'])
-        )
+    # Neighborhood stations use their 1-based position as ID, since transit data uses string numbers
+    nodes = [
+        (str(i), {
+            'name': node['Name'],
+            'type': 'station',
+            'population': 0,  # We don't have population data in this example
+            'pos': (node['X_coordinate'], node['Y_coordinate'])
+        })
+        for i, node in enumerate(facilities_data['neighborhoods'], 1)
+    ]
 
     # Add facility nodes - these keep their original IDs as they're referenced directly
-    for facility in facilities_data['facilities']:
-        G.add_node(
-            facility['ID'],
-            name=facility['Name'],
-            type='facility',
-            pos=(facility['X_coordinate'], facility['Y_coordinate']),
-            facility_type=facility['Type']
-        )
-
-    # Add metro lines
+    nodes += [
+        (facility['ID'], {
+            'name': facility['Name'],
+            'type': 'facility',
+            'pos': (facility['X_coordinate'], facility['Y_coordinate']),
+            'facility_type': facility['Type']
+        })
+        for facility in facilities_data['facilities']
+    ]
+    G.add_nodes_from(nodes)
+    node_ids = set(G)
+
+    # Node coordinates as one (N, 2) array, so distance queries can use pairwise_distances
+    G.graph['coord_index'] = {node_id: i for i, (node_id, _) in enumerate(nodes)}
+    G.graph['coord_array'] = np.array([attrs['pos'] for _, attrs in nodes], dtype=float)
+
+    # Add metro lines - one edge per segment, flagged bidirectional since trains run both ways
+    edges = []
     for line in transit_data['metro_lines']:
         stations = line['Stations_comma_separated_IDs']
-        for i in range(len(stations) - 1):
-            current_node = stations[i]
-            next_node = stations[i + 1]
-            if not G.has_node(current_node) or not G.has_node(next_node):
+        for current_node, next_node in zip(stations, stations[1:]):
+            if current_node not in node_ids or next_node not in node_ids:
                 print(f"Warning: Skipping metro edge {current_node}-{next_node} - one or both nodes missing")
                 continue
-            G.add_edge(
-                current_node, next_node, type='metro',
-                line_id=line['LineID'], passengers=line['Daily_Passengers']
-            )
-            G.add_edge(
-                next_node, current_node, type='metro',
-                line_id=line['LineID'], passengers=line['Daily_Passengers']
-            )
+            edges.append((current_node, next_node, {
+                'type': 'metro', 'line_id': line['LineID'],
+                'passengers': line['Daily_Passengers'], 'bidirectional': True
+            }))
+    G.add_edges_from(edges)
+    # Station order per line, so the map can draw each line as one continuous path
+    G.graph['metro_lines'] = {line['LineID']: line['Stations_comma_separated_IDs']
+                              for line in transit_data['metro_lines']}
 
     # Add bus routes
+    edges = []
     for route in transit_data['bus_routes']:
         stops = route['Stops_comma_separated_IDs']
-        for i in range(len(stops) - 1):
-            current_node = stops[i]
-            next_node = stops[i + 1]
-            if not G.has_node(current_node) or not G.has_node(next_node):
+        for current_node, next_node in zip(stops, stops[1:]):
+            if current_node not in node_ids or next_node not in node_ids:
                 print(f"Warning: Skipping bus edge {current_node}-{next_node} - one or both nodes missing")
                 continue
-            G.add_edge(
-                current_node, next_node, type='bus',
-                route_id=route['RouteID'], passengers=route['Daily_Passengers'],
-                buses=route['Buses_Assigned']
-            )
+            edges.append((current_node, next_node, {
+                'type': 'bus', 'route_id': route['RouteID'],
+                'passengers': route['Daily_Passengers'], 'buses': route['Buses_Assigned']
+            }))
+    G.add_edges_from(edges)
+    G.graph['bus_routes'] = {route['RouteID']: route['Stops_comma_separated_IDs']
+                             for route in transit_data['bus_routes']}
 
     return G
 
-def visualize_transit_graph(G):
-    """Visualize the transit graph statically and interactively"""
-    # Create interactive map
-    m = create_interactive_transit_map(G)
-    
-    # Save the interactive map
-    output_dir = os.path.join(os.path.dirname(__file__), '..', 'output', 'graphs')
-    os.makedirs(output_dir, exist_ok=True)
-    map_path = os.path.join(output_dir, 'transit_network_interactive.html')
-    m.save(map_path)
-    
-    # Create static visualization
-    plt.figure(figsize=(15, 10))
-    
+def visualize_transit_graph(G, render_png=True, dpi=150, render_html=True):
+    """Visualize the transit graph statically and interactively, then report its statistics
+
+    Set render_png/render_html to False to skip the matplotlib PNG or the folium map
+    when only the statistics are needed.
+    """
+    for directory in (GRAPHS_DIR, REPORTS_DIR):
+        os.makedirs(directory, exist_ok=True)
+    map_path = png_path = None
+
+    if render_html:
+        # Create and save the interactive map
+        m = create_interactive_transit_map(G)
+        map_path = os.path.join(GRAPHS_DIR, 'transit_network_interactive.html')
+        m.save(map_path)
+    
+    # Plain dict of node attributes, so each lookup below skips the NodeView
+    node_data = dict(G.nodes(data=True))
     pos = nx.get_node_attributes(G, 'pos')
     nodes_with_pos = list(pos.keys())
     
-    stations = [n for n in nodes_with_pos if G.nodes[n]['type'] == 'station']
-    facilities = [n for n in nodes_with_pos if G.nodes[n]['type'] == 'facility']
-    
-    if stations:
-        populations = [G.nodes[n].get('population', 0) for n in stations]
-        node_sizes = [max(100, min(1000, pop/5000)) for pop in populations]
-        nx.draw_networkx_nodes(G, pos, nodelist=stations, 
-                             node_color='lightgray', node_size=node_sizes,
-                             label='Stations')
-    
-    if facilities:
-        facility_types = [G.nodes[n].get('facility_type', 'Other') for n in facilities]
-        facility_colors = {
-            'Residential': 'green', 'Business': 'blue', 'Mixed': 'purple',
-            'Medical': 'red', 'Education': 'orange', 'Airport': 'cyan',
-            'Transit Hub': 'brown', 'Tourism': 'pink', 'Sports': 'gray',
-            'Commercial': 'yellow', 'Other': 'black'
-        }
-        facility_node_colors = [facility_colors.get(t, 'black') for t in facility_types]
-        nx.draw_networkx_nodes(G, pos, nodelist=facilities,
-                             node_color=facility_node_colors, node_size=200,
-                             node_shape='s', label='Facilities')
-    
-    metro_colors = {'M1': 'red', 'M2': 'blue', 'M3': 'green'}
-    for line_id, color in metro_colors.items():
-        line_edges = [(u, v) for u, v, d in G.edges(data=True) 
-                     if d.get('type') == 'metro' and d.get('line_id') == line_id
-                     and u in pos and v in pos]
-        if line_edges:
-            edge_weights = [max(2, min(7, G.edges[u, v, 0]['passengers']/300000)) 
-                          for u, v in line_edges]
-            nx.draw_networkx_edges(G, pos, edgelist=line_edges,
-                                 edge_color=color, width=edge_weights,
-                                 label=f'Metro {line_id}')
-    
-    bus_edges = [(u, v) for u, v, d in G.edges(data=True) 
-                 if d.get('type') == 'bus' and u in pos and v in pos]
-    if bus_edges:
-        bus_weights = []
-        for u, v in bus_edges:
-            # Find the bus edge data among multiple edges
-            edge_data = None
-            for _, _, data in G.edges(data=True):
-                if data.get('type') == 'bus' and \
-                   G.has_edge(u, v) and \
-                   data.get('buses') is not None:
-                    edge_data = data
-                    break
-
-            if edge_data:
-                weight = max(1.5, min(5, edge_data['buses']/10))
-                bus_weights.append(weight)
-            else:
-                bus_weights.append(2.0)  # Default weight if no bus data found
-        
-        nx.draw_networkx_edges(G, pos, edgelist=bus_edges,
-                             edge_color='orange', style='dashed',
-                             width=bus_weights, label='Bus Routes')
-    
-    labels = {
-        node: f"{G.nodes[node]['name']}\n({G.nodes[node].get('population', 0):,})"
-        if G.nodes[node]['type'] == 'station' and G.nodes[node].get('population', 0) > 300000
-        else G.nodes[node]['name']
-        for node in nodes_with_pos
-        if G.nodes[node]['type'] == 'facility' or
-           (G.nodes[node]['type'] == 'station' and G.nodes[node].get('population', 0) > 300000)
-    }
-    if labels:
-        nx.draw_networkx_labels(G, pos, labels, font_size=8)
-    
-    plt.title('Cairo Public Transit Network\nMetro Lines and Bus Routes\n'
-             'Node size: Population | Edge width: Passenger volume',
-             pad=20)
-    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.axis('off')
-    plt.tight_layout()
-    
-    output_dir = os.path.join(os.path.dirname(__file__), '..', 'output', 'graphs')
-    os.makedirs(output_dir, exist_ok=True)
-    png_path = os.path.join(output_dir, 'transit_network.png')
-    plt.savefig(png_path, bbox_inches='tight', dpi=300)
+    stations = [n for n in nodes_with_pos if node_data[n]['type'] == 'station']
+    facilities = [n for n in nodes_with_pos if node_data[n]['type'] == 'facility']
+    
+    if render_png:
+        # Create static visualization
+        # Constrained layout fits the outside legend without a second tight-bbox pass on save
+        fig, ax = plt.subplots(figsize=(15, 10), constrained_layout=True)
+
+        if stations:
+            populations = [node_data[n].get('population', 0) for n in stations]
+            node_sizes = [max(100, min(1000, pop/5000)) for pop in populations]
+            nx.draw_networkx_nodes(G, pos, nodelist=stations, 
+                                 node_color='lightgray', node_size=node_sizes,
+                                 label='Stations', ax=ax)
+    
+        if facilities:
+            facility_types = [node_data[n].get('facility_type', 'Other') for n in facilities]
+            facility_node_colors = [FACILITY_COLORS.get(t, 'black') for t in facility_types]
+            nx.draw_networkx_nodes(G, pos, nodelist=facilities,
+                                 node_color=facility_node_colors, node_size=200,
+                                 node_shape='s', label='Facilities', ax=ax)
+    
+        # Group the drawable metro edges by line in one pass, with their width from passenger volume
+        metro_by_line = defaultdict(list)
+        for u, v, d in G.edges(data=True):
+            if d.get('type') == 'metro' and u in pos and v in pos:
+                metro_by_line[d.get('line_id')].append((u, v, max(2, min(7, d['passengers']/300000))))
+
+        for line_id, color in METRO_COLORS.items():
+            line_edges = metro_by_line[line_id]
+            if line_edges:
+                # One edge per segment, but trains run both ways: draw plain lines, not one-way arrows
+                nx.draw_networkx_edges(G, pos, edgelist=[(u, v) for u, v, _ in line_edges],
+                                     edge_color=color, width=[w for _, _, w in line_edges],
+                                     arrows=False, label=f'Metro {line_id}', ax=ax)
+    
+        bus_edges_data = [(u, v, d) for u, v, d in G.edges(data=True)
+                          if d.get('type') == 'bus' and u in pos and v in pos]
+        if bus_edges_data:
+            # Width from each edge's own bus count (default width if no bus data)
+            bus_weights = [max(1.5, min(5, d['buses']/10)) if d.get('buses') is not None else 2.0
+                           for _, _, d in bus_edges_data]
+            nx.draw_networkx_edges(G, pos, edgelist=[(u, v) for u, v, _ in bus_edges_data],
+                                 edge_color='orange', style='dashed',
+                                 width=bus_weights, label='Bus Routes', ax=ax)
+    
+        # Label facilities, and stations serving more than 300k residents (with their population)
+        labels = {}
+        for node in nodes_with_pos:
+            data = node_data[node]
+            if data['type'] == 'facility':
+                labels[node] = data['name']
+            elif data['type'] == 'station' and data.get('population', 0) > 300000:
+                labels[node] = f"{data['name']}\n({data.get('population', 0):,})"
+        if labels:
+            nx.draw_networkx_labels(G, pos, labels, font_size=8, ax=ax)
+    
+        ax.set_title('Cairo Public Transit Network\nMetro Lines and Bus Routes\n'
+                     'Node size: Population | Edge width: Passenger volume',
+                     pad=20)
+        ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+        ax.set_axis_off()
+
+        png_path = os.path.join(GRAPHS_DIR, 'transit_network.png')
+        fig.savefig(png_path, dpi=dpi)
+        plt.close(fig)  # release the Agg buffer
     
     # Calculate and print detailed statistics
     nodes_without_pos = [n for n in G.nodes() if n not in pos]
     isolated_nodes = [n for n in G.nodes() if G.degree(n) == 0]
     
-    print("\n=== Cairo Transit Network Statistics ===")
-    print(f"\nVisualization files saved to:")
-    print(f"Interactive Map: {map_path}")
-    print(f"Static PNG: {png_path}")
-    
-    print("\nNode Statistics:")
-    print(f"Total Stations: {len(stations)}")
-    print(f"Total Facilities: {len(facilities)}")
-    print(f"Isolated Nodes: {len(isolated_nodes)}")
+    # Collect the console report and print it in one go
+    report = ["\n=== Cairo Transit Network Statistics ==="]
+    if map_path or png_path:
+        report.append(f"\nVisualization files saved to:")
+        if map_path:
+            report.append(f"Interactive Map: {map_path}")
+        if png_path:
+            report.append(f"Static PNG: {png_path}")
+    
+    report.append("\nNode Statistics:")
+    report.append(f"Total Stations: {len(stations)}")
+    report.append(f"Total Facilities: {len(facilities)}")
+    report.append(f"Isolated Nodes: {len(isolated_nodes)}")
     if isolated_nodes:
-        print("Isolated Nodes:", ', '.join(isolated_nodes))
+        report.append(f"Isolated Nodes: {', '.join(isolated_nodes)}")
     
-    total_population = sum(G.nodes[n].get('population', 0) for n in stations)
-    print(f"\nPopulation Statistics:")
-    print(f"Total Population Served: {total_population:,}")
+    total_population = sum(node_data[n].get('population', 0) for n in stations)
+    report.append(f"\nPopulation Statistics:")
+    report.append(f"Total Population Served: {total_population:,}")
     
-    major_stations = [(n, G.nodes[n]) for n in stations 
-                     if G.nodes[n].get('population', 0) > 300000]
+    major_stations = [(n, node_data[n]) for n in stations
+                     if node_data[n].get('population', 0) > 300000]
     if major_stations:
-        print(f"\nMajor Stations (>300k population):")
+        report.append(f"\nMajor Stations (>300k population):")
         for node, data in sorted(major_stations, 
                                key=lambda x: x[1].get('population', 0), 
                                reverse=True):
-            print(f"  - {data['name']}: {data['population']:,} residents")
+            report.append(f"  - {data['name']}: {data['population']:,} residents")
     
-    facility_counts = defaultdict(int)
-    for f in facilities:
-        f_type = G.nodes[f].get('facility_type', 'Other')
-        facility_counts[f_type] += 1
+    facility_counts = Counter(node_data[f].get('facility_type', 'Other') for f in facilities)
     
-    print("\nFacility Types:")
+    report.append("\nFacility Types:")
     for f_type, count in sorted(facility_counts.items()):
-        print(f"  - {f_type}: {count}")
+        report.append(f"  - {f_type}: {count}")
+    
+    # Aggregate all per-line/per-route edge statistics in a single pass
+    metro_passengers_by_line = defaultdict(int)
+    metro_stations_by_line = defaultdict(set)
+    bus_passengers_by_route = defaultdict(int)
+    total_buses = 0
+    for u, v, d in G.edges(data=True):
+        if d.get('type') == 'metro':
+            metro_passengers_by_line[d['line_id']] += d['passengers']
+            metro_stations_by_line[d['line_id']].update((u, v))
+        elif d.get('type') == 'bus':
+            bus_passengers_by_route[d['route_id']] += d['passengers']
+            total_buses += d['buses']
+    metro_lines = metro_passengers_by_line.keys()
+    bus_routes = bus_passengers_by_route.keys()
+    
+    report.append("\nTransit Line Statistics:")
+    report.append(f"Metro Lines: {len(metro_lines)}")
+    
+    report.append("\nMetro Line Details:")
+    for line in sorted(metro_lines):
+        passengers = metro_passengers_by_line[line]
+        stations_served = len(metro_stations_by_line[line])
+        report.append(f"  - {line}: {passengers:,} daily passengers, {stations_served} stations")
     
-    metro_lines = set(d['line_id'] for _, _, d in G.edges(data=True) 
-                     if d.get('type') == 'metro')
-    bus_routes = set(d['route_id'] for _, _, d in G.edges(data=True) 
-                    if d.get('type') == 'bus')
+    report.append(f"\nBus Routes: {len(bus_routes)}")
     
-    print("\nTransit Line Statistics:")
-    print(f"Metro Lines: {len(metro_lines)}")
+    report.append(f"Total Buses in Service: {total_buses}")
     
-    print("\nMetro Line Details:")
-    for line in sorted(metro_lines):
-        line_edges = [(u, v, d) for u, v, d in G.edges(data=True)
-                     if d.get('type') == 'metro' and d.get('line_id') == line]
-        passengers = sum(d['passengers'] for _, _, d in line_edges) // 2  # Halve for bidirectional
-        stations_served = len(set([u for u, _, _ in line_edges] + 
-                               [v for _, v, _ in line_edges]))
-        print(f"  - {line}: {passengers:,} daily passengers, {stations_served} stations")
-    
-    print(f"\nBus Routes: {len(bus_routes)}")
-    
-    total_buses = sum(d['buses'] for _, _, d in G.edges(data=True)
-                     if d.get('type') == 'bus')
-    print(f"Total Buses in Service: {total_buses}")
-    
-    metro_passengers = sum(d['passengers'] for _, _, d in G.edges(data=True)
-                         if d.get('type') == 'metro') // 2  # Halve for bidirectional
-    bus_passengers = sum(d['passengers'] for _, _, d in G.edges(data=True)
-                        if d.get('type') == 'bus')
+    metro_passengers = sum(metro_passengers_by_line.values())
+    bus_passengers = sum(bus_passengers_by_route.values())
     total_passengers = metro_passengers + bus_passengers
     
-    print("\nDaily Passenger Statistics:")
+    report.append("\nDaily Passenger Statistics:")
     if total_passengers > 0:
-        print(f"Metro Passengers: {metro_passengers:,} ({metro_passengers/total_passengers*100:.1f}%)")
-        print(f"Bus Passengers: {bus_passengers:,} ({bus_passengers/total_passengers*100:.1f}%)")
-        print(f"Total Passengers: {total_passengers:,}")
+        report.append(f"Metro Passengers: {metro_passengers:,} ({metro_passengers/total_passengers*100:.1f}%)")
+        report.append(f"Bus Passengers: {bus_passengers:,} ({bus_passengers/total_passengers*100:.1f}%)")
+        report.append(f"Total Passengers: {total_passengers:,}")
     else:
-        print("No passenger data available")
+        report.append("No passenger data available")
     
-    print("\nEfficiency Metrics:")
+    report.append("\nEfficiency Metrics:")
     if len(metro_lines) > 0:
-        print(f"Average Passengers per Metro Line: {metro_passengers // len(metro_lines):,}")
+        report.append(f"Average Passengers per Metro Line: {metro_passengers // len(metro_lines):,}")
     if len(bus_routes) > 0:
-        print(f"Average Passengers per Bus Route: {bus_passengers // len(bus_routes):,}")
+        report.append(f"Average Passengers per Bus Route: {bus_passengers // len(bus_routes):,}")
     if total_buses > 0:
-        print(f"Average Daily Passengers per Bus: {bus_passengers // total_buses:,}")
-    
-    print("\nNetwork Connectivity:")
-    print(f"Total Network Nodes: {G.number_of_nodes()}")
-    print(f"Total Network Edges: {G.number_of_edges()}")
-    avg_degree = sum(dict(G.degree()).values()) / G.number_of_nodes()
-    print(f"Average Node Degree: {avg_degree:.2f}")
-    
-    stats_dir = os.path.join(os.path.dirname(__file__), '..', 'output', 'reports')
-    os.makedirs(stats_dir, exist_ok=True)
-    stats_file = os.path.join(stats_dir, 'transit_network_statistics.txt')
-    
+        report.append(f"Average Daily Passengers per Bus: {bus_passengers // total_buses:,}")
+    
+    report.append("\nNetwork Connectivity:")
+    report.append(f"Total Network Nodes: {G.number_of_nodes()}")
+    report.append(f"Total Network Edges: {G.number_of_edges()}")
+    avg_degree = 2 * G.number_of_edges() / G.number_of_nodes()  # each edge adds one in- and one out-degree
+    report.append(f"Average Node Degree: {avg_degree:.2f}")
+    print('\n'.join(report))
+    
+    stats_file = os.path.join(REPORTS_DIR, 'transit_network_statistics.txt')
+    
+    parts = [
+        "Cairo Transit Network Statistics\n",
+        f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n",
+        "Network Summary:\n",
+        f"- Total Stations: {len(stations)}\n",
+        f"- Total Facilities: {len(facilities)}\n",
+        f"- Isolated Nodes: {len(isolated_nodes)}\n",
+        f"- Total Population Served: {total_population:,}\n"
+    ]
+    if total_passengers > 0:
+        parts += [
+            f"- Daily Passengers: {total_passengers:,}\n",
+            f"  * Metro: {metro_passengers:,}\n",
+            f"  * Bus: {bus_passengers:,}\n"
+        ]
+    else:
+        parts.append("- No passenger data available\n")
+    parts += [
+        "\nTransit Infrastructure:\n",
+        f"- Metro Lines: {len(metro_lines)}\n",
+        f"- Bus Routes: {len(bus_routes)}\n",
+        f"- Total Buses: {total_buses}\n"
+    ]
+
     with open(stats_file, 'w') as f:
-        f.write("Cairo Transit Network Statistics\n")
-        f.write(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        f.write(f"Network Summary:\n")
-        f.write(f"- Total Stations: {len(stations)}\n")
-        f.write(f"- Total Facilities: {len(facilities)}\n")
-        f.write(f"- Isolated Nodes: {len(isolated_nodes)}\n")
-        f.write(f"- Total Population Served: {total_population:,}\n")
-        if total_passengers > 0:
-            f.write(f"- Daily Passengers: {total_passengers:,}\n")
-            f.write(f"  * Metro: {metro_passengers:,}\n")
-            f.write(f"  * Bus: {bus_passengers:,}\n")
-        else:
-            f.write("- No passenger data available\n")
-        f.write(f"\nTransit Infrastructure:\n")
-        f.write(f"- Metro Lines: {len(metro_lines)}\n")
-        f.write(f"- Bus Routes: {len(bus_routes)}\n")
-        f.write(f"- Total Buses: {total_buses}\n")
+        f.write(''.join(parts))
     
     print(f"\nDetailed statistics saved to: {stats_file}")
 
@@ -305,6 +437,12 @@ def create_interactive_transit_map(G):
     # Create map centered on Cairo
     cairo_center = [30.05, 31.25]  # Lat, Lon
     m = folium.Map(location=cairo_center, zoom_start=11)
+
+    # Markers and lines go into layer groups that are attached to the map once at the end
+    stations_fg = folium.FeatureGroup(name='Stations')
+    facilities_fg = MarkerCluster(name='Facilities')
+    metro_fg = folium.FeatureGroup(name='Metro')
+    bus_fg = folium.FeatureGroup(name='Bus')
     
     # Add stations and facilities
     for node, data in G.nodes(data=True):
@@ -316,102 +454,108 @@ def create_interactive_transit_map(G):
         location = [pos[1], pos[0]]
         
         if data['type'] == 'station':
-            popup_content = f"""
-            <div style='min-width: 200px'>
-                <h4>{data['name']}</h4>
-                <b>Type:</b> Transit Station<br>
-                <b>Population Served:</b> {data.get('population', 'N/A'):,}<br>
-                <b>ID:</b> {node}
-            </div>
-            """
+            popup_content = _STATION_POPUP.format(name=data['name'], population=data.get('population') or 0,
+                                                  node=node)
             folium.CircleMarker(
                 location=location,
                 radius=6,
-                popup=folium.Popup(popup_content, max_width=300),
+                popup=folium.Popup(popup_content, max_width=300, parse_html=False),
                 color='gray',
                 fill=True,
                 fillColor='lightgray',
                 fillOpacity=0.7,
                 weight=2
-            ).add_to(m)
+            ).add_to(stations_fg)
         else:  # facility
             facility_type = data.get('facility_type', 'Other')
-            popup_content = f"""
-            <div style='min-width: 200px'>
-                <h4>{data['name']}</h4>
-                <b>Type:</b> {facility_type}<br>
-                <b>ID:</b> {node}
-            </div>
-            """
-            icon = 'plus' if facility_type == 'Medical' else (
-                   'graduation-cap' if facility_type == 'Education' else (
-                   'plane' if facility_type == 'Airport' else (
-                   'building' if facility_type == 'Business' else (
-                   'shopping-cart' if facility_type == 'Commercial' else (
-                   'home' if facility_type == 'Residential' else (
-                   'train' if facility_type == 'Transit Hub' else (
-                   'camera' if facility_type == 'Tourism' else (
-                   'futbol-o' if facility_type == 'Sports' else 'star'))))))))
+            popup_content = _FACILITY_POPUP.format(name=data['name'], facility_type=facility_type, node=node)
+            icon = FACILITY_ICONS.get(facility_type, 'star')
             
             folium.Marker(
                 location=location,
-                popup=folium.Popup(popup_content, max_width=300),
+                popup=folium.Popup(popup_content, max_width=300, parse_html=False),
                 icon=folium.Icon(color='red', icon=icon, prefix='fa'),
                 tooltip=data['name']
-            ).add_to(m)
-    
-    # Add transit lines
-    metro_colors = {'M1': 'red', 'M2': 'blue', 'M3': 'green'}
-    
-    for line_id, color in metro_colors.items():
-        edges = [(u, v, d) for u, v, d in G.edges(data=True) 
-                if d.get('type') == 'metro' and d.get('line_id') == line_id]
-        for u, v, data in edges:
-            if 'pos' not in G.nodes[u] or 'pos' not in G.nodes[v]:
-                print(f"Warning: Metro edge between {u} and {v} skipped - missing position data")
-                continue
-            coordinates = [
-                [G.nodes[u]['pos'][1], G.nodes[u]['pos'][0]],
-                [G.nodes[v]['pos'][1], G.nodes[v]['pos'][0]]
-            ]
-            popup_content = f"""
-            <div>
-                <b>Metro Line:</b> {line_id}<br>
-                <b>Daily Passengers:</b> {data['passengers']:,}
-            </div>
-            """
-            folium.PolyLine(
-                coordinates,
-                weight=4,
-                color=color,
-                popup=popup_content,
-                opacity=0.8
-            ).add_to(m)
-    
-    bus_edges = [(u, v, d) for u, v, d in G.edges(data=True) if d.get('type') == 'bus']
-    for u, v, data in bus_edges:
-        if 'pos' not in G.nodes[u] or 'pos' not in G.nodes[v]:
-            print(f"Warning: Bus edge between {u} and {v} skipped - missing position data")
+            ).add_to(facilities_fg)
+    
+    # Coordinate table from create_transit_graph, or built from the pos attributes for other graphs
+    coord_index = G.graph.get('coord_index')
+    coord_array = G.graph.get('coord_array')
+    if coord_index is None or coord_array is None:
+        pos = nx.get_node_attributes(G, 'pos')
+        coord_index = {node: i for i, node in enumerate(pos)}
+        coord_array = np.array(list(pos.values()), dtype=float).reshape(-1, 2)
+    # pos is (x, y) = (lon, lat); Folium wants [lat, lon]
+    coords_latlon = coord_array[:, ::-1].tolist()
+
+    # Partition the edges by metro line / bus route in a single pass
+    by_bucket = defaultdict(list)
+    for u, v, d in G.edges(data=True):
+        if d.get('type') == 'metro':
+            by_bucket[('metro', d.get('line_id'))].append((u, v, d))
+        elif d.get('type') == 'bus':
+            by_bucket[('bus', d.get('route_id'))].append((u, v, d))
+
+    def line_segments(kind, line_edges, stops):
+        """Coalesce a line's edges into runs of [lat, lon] waypoints following the stop order"""
+        drawable = set()
+        for u, v, _ in line_edges:
+            if u not in coord_index or v not in coord_index:
+                print(f"Warning: {kind} edge between {u} and {v} skipped - missing position data")
+            else:
+                drawable.add((u, v))
+        if stops is None:  # no stop order recorded on the graph: one segment per edge
+            return [[coords_latlon[coord_index[u]], coords_latlon[coord_index[v]]] for u, v in drawable]
+        segments, run = [], []
+        for u, v in zip(stops, stops[1:]):
+            if (u, v) in drawable:
+                if not run:
+                    run = [coords_latlon[coord_index[u]]]
+                run.append(coords_latlon[coord_index[v]])
+            elif run:
+                segments.append(run)
+                run = []
+        if run:
+            segments.append(run)
+        return segments
+
+    # Add transit lines, one (multi-)PolyLine per metro line and bus route
+    metro_order = G.graph.get('metro_lines', {})
+    for line_id, color in METRO_COLORS.items():
+        line_edges = by_bucket[('metro', line_id)]
+        segments = line_segments('Metro', line_edges, metro_order.get(line_id))
+        if not segments:
             continue
-        coordinates = [
-            [G.nodes[u]['pos'][1], G.nodes[u]['pos'][0]],
-            [G.nodes[v]['pos'][1], G.nodes[v]['pos'][0]]
-        ]
-        popup_content = f"""
-        <div>
-            <b>Bus Route:</b> {data['route_id']}<br>
-            <b>Daily Passengers:</b> {data['passengers']:,}<br>
-            <b>Buses Assigned:</b> {data['buses']}
-        </div>
-        """
-        folium.PolyLine(        coordinates,
+        popup_content = _METRO_POPUP.format(line_id=line_id, passengers=line_edges[0][2]['passengers'])
+        folium.PolyLine(
+            segments,
+            weight=4,
+            color=color,
+            popup=folium.Popup(popup_content, parse_html=False),
+            opacity=0.8
+        ).add_to(metro_fg)
+    
+    bus_order = G.graph.get('bus_routes', {})
+    for (kind, route_id), route_edges in by_bucket.items():
+        if kind != 'bus':
+            continue
+        segments = line_segments('Bus', route_edges, bus_order.get(route_id))
+        if not segments:
+            continue
+        data = route_edges[0][2]
+        popup_content = _BUS_POPUP.format(route_id=route_id, passengers=data['passengers'],
+                                          buses=data['buses'])
+        folium.PolyLine(
+            segments,
             weight=4,
             color='black',
-            popup=popup_content,
+            popup=folium.Popup(popup_content, parse_html=False),
             opacity=0.6,
             dash_array='10,10'
-        ).add_to(m)
+        ).add_to(bus_fg)
     
+    for group in (stations_fg, facilities_fg, metro_fg, bus_fg):
+        group.add_to(m)
     folium.LayerControl().add_to(m)
     
     return m
@@ -1,17 +1,35 @@
 import json
 import networkx as nx
-import heapq
+import itertools
+from collections import OrderedDict
 import math
+import threading
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # A* runs through NetworkX instead of the CSR kernel
+    njit = None
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library parser
+    orjson = None
+
+INF = float("inf")
 
 # --- Data Loading (Shared logic) ---
 def load_json_data(file_path):
     try:
+        if orjson is not None:
+            with open(file_path, "rb") as f:
+                return orjson.loads(f.read())
         with open(file_path, "r") as f:
             return json.load(f)
     except FileNotFoundError:
         print(f"Error: Data file not found at {file_path}")
         return None
-    except json.JSONDecodeError:
+    except ValueError: # json.JSONDecodeError and orjson.JSONDecodeError
         print(f"Error: Could not decode JSON from {file_path}")
         return None
 
@@ -26,37 +44,39 @@ def get_emergency_graph(road_data_path, facilities_data_path, traffic_data_path)
 
     graph = nx.DiGraph()
 
+    # Collect node attributes first (facility entries update matching road nodes), then insert in one call
+    nodes = {}
     # Add nodes from road_data (neighborhoods)
     if "nodes" in road_data:
         for node_info in road_data["nodes"]:
-            node_id = str(node_info["ID"])
-            graph.add_node(node_id, **node_info)
+            nodes.setdefault(str(node_info["ID"]), {}).update(node_info)
     
     # Add nodes from facilities_data
     if facilities_data:
         for facility_info in facilities_data:
-            facility_id = str(facility_info["ID"])
-            if facility_id not in graph:
-                graph.add_node(facility_id, **facility_info)
-            else:
-                graph.nodes[facility_id].update(facility_info)
+            nodes.setdefault(str(facility_info["ID"]), {}).update(facility_info)
 
-    # Add edges from road_data
+    # Collect edges from road_data
+    edges = []
     if "edges" in road_data:
         for edge_info in road_data["edges"]:
             u, v = str(edge_info["FromID"]), str(edge_info["ToID"])
-            if not graph.has_node(u): graph.add_node(u, ID=u, Name=f"Node {u}")
-            if not graph.has_node(v): graph.add_node(v, ID=v, Name=f"Node {v}")
+            if u not in nodes: nodes[u] = {"ID": u, "Name": f"Node {u}"}
+            if v not in nodes: nodes[v] = {"ID": v, "Name": f"Node {v}"}
             
             attrs = {
-                "distance_km": float(edge_info.get("Distance_km", float("inf"))),
+                "distance_km": float(edge_info.get("Distance_km", INF)),
                 "base_capacity_veh_hr": int(edge_info.get("Current_Capacity_vehicles_hour", 
                                                           edge_info.get("Estimated_Capacity_vehicles_hour", 1000))),
                 "status": edge_info.get("status", "unknown")
             }
-            # Add edges in both directions for emergency access
-            graph.add_edge(u, v, **attrs)
-            graph.add_edge(v, u, **attrs)  # Add reverse direction
+            # Add edges in both directions for emergency access. add_edges_from copies attrs into
+            # each edge's own dict, so traffic data added below still applies to one direction only
+            edges.append((u, v, attrs))
+            edges.append((v, u, attrs))  # Add reverse direction
+
+    graph.add_nodes_from(nodes.items())
+    graph.add_edges_from(edges)
 
     # Augment with traffic data for time-dependent considerations
     if traffic_data:
@@ -66,11 +86,282 @@ def get_emergency_graph(road_data_path, facilities_data_path, traffic_data_path)
                 for key, val in traffic_entry.items():
                     if key not in ["RoadID_From", "RoadID_To"]:
                         graph[u][v][key.lower()] = int(val)
+
+    # Array form of the road network for the compiled search kernels
+    graph.graph["csr"] = EmergencyCSR(graph)
     return graph
 
+class EmergencyCSR:
+    """
+    Structure-of-arrays (compressed sparse row) form of the emergency graph, built once so the
+    array-based searches never touch NetworkX's nested dicts per edge.
+    Out-edges of node i are indices[indptr[i]:indptr[i+1]]; dist, cap and the traf_* flows
+    (morning peak, afternoon, evening peak, night; 0 where unknown) are per-edge arrays in the
+    same slots. In-edges of node i are rev_indices[rev_indptr[i]:rev_indptr[i+1]] (the edge sources),
+    with rev_edge giving each one's forward edge slot. xy holds node coordinates (NaN where missing), and id2idx / idx2id map node IDs
+    to array positions.
+    """
+    __slots__ = ("indptr", "indices", "rev_indptr", "rev_indices", "rev_edge",
+                 "dist", "cap", "traf_m", "traf_a", "traf_e", "traf_n", "xy", "id2idx", "idx2id")
+    _TRAFFIC_SLOTS = {"morning_peak": "traf_m", "afternoon": "traf_a",
+                      "evening_peak": "traf_e", "night": "traf_n"}
+
+    def __init__(self, graph):
+        self.idx2id = list(graph.nodes())
+        self.id2idx = {node: i for i, node in enumerate(self.idx2id)}
+        n = len(self.idx2id)
+
+        self.indptr = np.zeros(n + 1, dtype=np.int32)
+        indices, dist, cap = [], [], []
+        flows = {attr: [] for attr in TRAFFIC_COL_MAP.values()}
+        for i, node in enumerate(self.idx2id):
+            for nbr, data in graph._adj[node].items():
+                indices.append(self.id2idx[nbr])
+                dist.append(data.get("distance_km", INF))
+                cap.append(data.get("base_capacity_veh_hr", 1) or 1)
+                for attr, values in flows.items():
+                    values.append(data.get(attr, 0))
+            self.indptr[i + 1] = len(indices)
+        self.indices = np.array(indices, dtype=np.int32)
+        # Transpose for backward searches: group edges by target, keeping forward order within a group
+        edge_src = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.indptr))
+        self.rev_edge = np.argsort(self.indices, kind="stable").astype(np.int32)
+        self.rev_indices = edge_src[self.rev_edge]
+        self.rev_indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.indices, minlength=n), out=self.rev_indptr[1:])
+        self.dist = np.array(dist, dtype=np.float64)
+        self.cap = np.array(cap, dtype=np.float64)
+        self.traf_m = np.array(flows["morning_peak_veh_h"], dtype=np.float64)
+        self.traf_a = np.array(flows["afternoon_veh_h"], dtype=np.float64)
+        self.traf_e = np.array(flows["evening_peak_veh_h"], dtype=np.float64)
+        self.traf_n = np.array(flows["night_veh_h"], dtype=np.float64)
+
+        self.xy = np.full((n, 2), np.nan, dtype=np.float64)
+        for i, node in enumerate(self.idx2id):
+            data = graph.nodes[node]
+            x = data.get("X_coordinate")
+            y = data.get("Y_coordinate")
+            if x is not None and y is not None:
+                self.xy[i, 0] = x
+                self.xy[i, 1] = y
+
+    def traffic(self, time_of_day):
+        """Per-edge traffic flow array for a time of day, or None for an unknown one."""
+        slot = self._TRAFFIC_SLOTS.get(time_of_day)
+        return None if slot is None else getattr(self, slot)
+
+def build_effective_weights(graph_csr, time_of_day, priority):
+    """
+    Computes every edge's A* weight for one (time_of_day, priority) pair in a single vectorized pass,
+    using the same congestion model as a_star_emergency_path. time_of_day=None gives static weights.
+    """
+    flow = graph_csr.traffic(time_of_day)
+    if flow is None:
+        return graph_csr.dist * priority
+    congestion_factor = np.minimum(1 + flow / (graph_csr.cap * 1.5), 3.0)
+    return graph_csr.dist * congestion_factor * priority
+
+def heuristic_array(graph_csr, target_idx, priority):
+    """
+    Euclidean heuristic from every node to the target in one vectorized pass (0 where coordinates
+    are missing), so the A* kernel's inner loop only loads a precomputed value.
+    """
+    d = graph_csr.xy - graph_csr.xy[target_idx]
+    h = np.sqrt(d[:, 0] * d[:, 0] + d[:, 1] * d[:, 1]) * priority
+    h[np.isnan(h)] = 0.0
+    return h
+
+def _heap_less(keys, vals, i, j):
+    return keys[i] < keys[j] or (keys[i] == keys[j] and vals[i] < vals[j])
+
+def _heap_swap(keys, vals, i, j):
+    keys[i], keys[j] = keys[j], keys[i]
+    vals[i], vals[j] = vals[j], vals[i]
+
+def _sift_up(keys, vals, i):
+    while i > 0:
+        parent = (i - 1) >> 1
+        if not _heap_less(keys, vals, i, parent):
+            break
+        _heap_swap(keys, vals, i, parent)
+        i = parent
+
+def _sift_down(keys, vals, size, i):
+    while True:
+        smallest = i
+        left = 2 * i + 1
+        right = left + 1
+        if left < size and _heap_less(keys, vals, left, smallest):
+            smallest = left
+        if right < size and _heap_less(keys, vals, right, smallest):
+            smallest = right
+        if smallest == i:
+            break
+        _heap_swap(keys, vals, i, smallest)
+        i = smallest
+
+def _heap_push(keys, vals, size, key, val):
+    """Pushes (key, val) onto the binary heap held in keys/vals[:size]; returns the new size."""
+    keys[size] = key
+    vals[size] = val
+    _sift_up(keys, vals, size)
+    return size + 1
+
+def _heap_pop(keys, vals, size):
+    """Pops the smallest (key, val) from the heap; returns key, val and the new size."""
+    key = keys[0]
+    val = vals[0]
+    size -= 1
+    keys[0] = keys[size]
+    vals[0] = vals[size]
+    _sift_down(keys, vals, size, 0)
+    return key, val, size
+
+def _bidir_astar_csr(indptr, indices, rev_indptr, rev_indices, rev_edge, weights, h_f, h_b, src, tgt):
+    """
+    Bidirectional A* over CSR arrays: a forward search from src guided by h_f (distance to tgt) and a
+    backward search from tgt over the reversed edges guided by h_b (distance to src), each expanding
+    whichever frontier has the smaller key. mu is the shortest src-tgt path seen where the searches
+    meet; it is optimal once either frontier's smallest key reaches it.
+    Returns per-side predecessor node and edge arrays and the meeting node (-1 if unreachable).
+    """
+    n = indptr.shape[0] - 1
+    g_f = np.full(n, np.inf)
+    g_b = np.full(n, np.inf)
+    prev_f = np.full(n, -1, dtype=np.int64)
+    prev_b = np.full(n, -1, dtype=np.int64)
+    edge_f = np.full(n, -1, dtype=np.int64)
+    edge_b = np.full(n, -1, dtype=np.int64)
+    closed_f = np.zeros(n, dtype=np.bool_)
+    closed_b = np.zeros(n, dtype=np.bool_)
+
+    # Array-backed heaps with lazy deletion: every improvement pushes, stale entries are skipped on pop
+    capacity = indices.shape[0] + 1
+    keys_f = np.empty(capacity)
+    vals_f = np.empty(capacity, dtype=np.int64)
+    keys_b = np.empty(capacity)
+    vals_b = np.empty(capacity, dtype=np.int64)
+
+    g_f[src] = 0.0
+    g_b[tgt] = 0.0
+    size_f = _heap_push(keys_f, vals_f, 0, h_f[src], src)
+    size_b = _heap_push(keys_b, vals_b, 0, h_b[tgt], tgt)
+    # src == tgt is already the empty path; mu = 0 stops the search before it can return a cycle
+    mu = 0.0 if src == tgt else np.inf
+    meet = src if src == tgt else -1
+    while size_f > 0 and size_b > 0:
+        if keys_f[0] >= mu or keys_b[0] >= mu:
+            break
+        if keys_f[0] <= keys_b[0]:
+            _, u, size_f = _heap_pop(keys_f, vals_f, size_f)
+            if closed_f[u]:
+                continue
+            closed_f[u] = True
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                if closed_f[v]:
+                    continue
+                cand = g_f[u] + weights[k]
+                if cand < g_f[v]:
+                    g_f[v] = cand
+                    prev_f[v] = u
+                    edge_f[v] = k
+                    size_f = _heap_push(keys_f, vals_f, size_f, cand + h_f[v], v)
+                    if cand + g_b[v] < mu:
+                        mu = cand + g_b[v]
+                        meet = v
+        else:
+            _, u, size_b = _heap_pop(keys_b, vals_b, size_b)
+            if closed_b[u]:
+                continue
+            closed_b[u] = True
+            for j in range(rev_indptr[u], rev_indptr[u + 1]):
+                v = rev_indices[j]
+                if closed_b[v]:
+                    continue
+                k = rev_edge[j]
+                cand = g_b[u] + weights[k]
+                if cand < g_b[v]:
+                    g_b[v] = cand
+                    prev_b[v] = u
+                    edge_b[v] = k
+                    size_b = _heap_push(keys_b, vals_b, size_b, cand + h_b[v], v)
+                    if cand + g_f[v] < mu:
+                        mu = cand + g_f[v]
+                        meet = v
+    return prev_f, prev_b, edge_f, edge_b, meet
+
+def _dijkstra_csr(indptr, indices, weights, sources, is_target):
+    """
+    Multi-source Dijkstra over CSR arrays that stops as soon as the first target node is settled.
+    Returns the g-score and predecessor arrays and the settled target (-1 if none is reachable).
+    """
+    n = indptr.shape[0] - 1
+    g = np.full(n, np.inf)
+    prev = np.full(n, -1, dtype=np.int64)
+    closed = np.zeros(n, dtype=np.bool_)
+
+    keys = np.empty(indices.shape[0] + sources.shape[0])
+    vals = np.empty(indices.shape[0] + sources.shape[0], dtype=np.int64)
+    size = 0
+    for s in sources:
+        g[s] = 0.0
+        size = _heap_push(keys, vals, size, 0.0, s)
+    while size > 0:
+        d, u, size = _heap_pop(keys, vals, size)
+        if closed[u]:
+            continue
+        closed[u] = True
+        if is_target[u]:
+            return g, prev, u
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            if closed[v]:
+                continue
+            cand = d + weights[k]
+            if cand < g[v]:
+                g[v] = cand
+                prev[v] = u
+                size = _heap_push(keys, vals, size, cand, v)
+    return g, prev, -1
+
+if njit is not None:
+    _heap_less = njit(inline="always")(_heap_less)
+    _heap_swap = njit(inline="always")(_heap_swap)
+    _sift_up = njit(inline="always")(_sift_up)
+    _sift_down = njit(inline="always")(_sift_down)
+    _heap_push = njit(inline="always")(_heap_push)
+    _heap_pop = njit(inline="always")(_heap_pop)
+    _bidir_astar_csr = njit(cache=True)(_bidir_astar_csr)
+    _dijkstra_csr = njit(cache=True)(_dijkstra_csr)
+    # Compile now so the first real query doesn't pay the JIT latency
+    _bidir_astar_csr(np.array([0, 1, 1], dtype=np.int32), np.array([1], dtype=np.int32),
+                     np.array([0, 0, 1], dtype=np.int32), np.array([0], dtype=np.int32), np.array([0], dtype=np.int32),
+                     np.array([1.0]), np.zeros(2), np.zeros(2), 0, 1)
+    _dijkstra_csr(np.array([0, 1, 1], dtype=np.int32), np.array([1], dtype=np.int32),
+                  np.array([1.0]), np.array([0], dtype=np.int64), np.array([False, True]))
+
 # --- A* Algorithm for Emergency Routing ---
+# Edge attribute holding the traffic flow for each time of day (see get_emergency_graph)
+TRAFFIC_COL_MAP = {
+    "morning_peak": "morning_peak_veh_h",
+    "afternoon": "afternoon_veh_h",
+    "evening_peak": "evening_peak_veh_h",
+    "night": "night_veh_h"
+}
+
 def heuristic_distance(graph, node1_id, node2_id):
     """Euclidean distance heuristic using X_coordinate and Y_coordinate."""
+    csr = graph.graph.get("csr")
+    if csr is not None and node1_id in csr.id2idx and node2_id in csr.id2idx:
+        # Coordinates were parsed once into the xy array; missing ones are NaN
+        p1 = csr.xy[csr.id2idx[node1_id]]
+        p2 = csr.xy[csr.id2idx[node2_id]]
+        dx = p1[0] - p2[0]
+        dy = p1[1] - p2[1]
+        d = math.sqrt(dx*dx + dy*dy)
+        return 0 if math.isnan(d) else d
+
     node1_data = graph.nodes.get(node1_id, {})
     node2_data = graph.nodes.get(node2_id, {})
     
@@ -83,9 +374,81 @@ def heuristic_distance(graph, node1_id, node2_id):
         return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
     return 0 # Default if coordinates are missing
 
+def dynamic_weight_function(weight_key="distance_km", time_dependent=False, time_of_day=None,
+                            emergency_priority_factor=1.0):
+    """Builds the per-edge weight function for emergency routing."""
+    # Resolve the traffic column once per query rather than once per examined edge
+    traffic_attr = TRAFFIC_COL_MAP.get(time_of_day) if time_dependent and time_of_day else None
+
+    def get_dynamic_edge_weight(u, v, data):
+        base_weight = data.get(weight_key, INF)
+        effective_weight = base_weight
+
+        if traffic_attr and traffic_attr in data:
+            traffic_flow = data[traffic_attr]
+            capacity = data.get("base_capacity_veh_hr", 1)
+            if capacity == 0: capacity = 1
+                
+            # For emergency, high congestion might be less of a deterrent or handled differently
+            # Simple model: still consider congestion but perhaps less impactful than normal routing
+            congestion_factor = 1 + (traffic_flow / (capacity * 1.5)) # Assume emergency can bypass some congestion
+            congestion_factor = min(congestion_factor, 3.0) # Cap factor
+            effective_weight = base_weight * congestion_factor
+        
+        # Apply emergency priority factor
+        return effective_weight * emergency_priority_factor
+
+    return get_dynamic_edge_weight
+
+# Number of effective-weight tables kept per graph; the least recently used one is dropped beyond this
+MAX_EFFECTIVE_WEIGHT_TABLES = 8
+# Guards the tables, since one graph can be shared by several threads (e.g. dashboard sessions)
+_effective_weights_lock = threading.Lock()
+
+def effective_weight_function(graph, weight_key="distance_km", time_dependent=False, time_of_day=None,
+                              emergency_priority_factor=1.0):
+    """
+    Returns a NetworkX weight function that looks each edge's effective weight up in a table computed
+    once per combination of arguments, so an edge probe is a dict lookup instead of a call into the
+    congestion model. The tables are kept in a small LRU under graph.graph["effective_weights"] and
+    never written into the edge dicts. Call invalidate_effective_weights(graph) after changing edge data.
+    """
+    tod = time_of_day if time_dependent else None
+    key = (weight_key, tod, emergency_priority_factor)
+    with _effective_weights_lock:
+        cache = graph.graph.get("effective_weights")
+        if cache is None or cache["num_edges"] != graph.number_of_edges(): # Edges added or removed
+            cache = graph.graph["effective_weights"] = {"num_edges": graph.number_of_edges(), "tables": OrderedDict()}
+        tables = cache["tables"]
+
+        table = tables.get(key)
+        if table is None:
+            get_dynamic_edge_weight = dynamic_weight_function(weight_key, time_dependent, time_of_day,
+                                                              emergency_priority_factor)
+            table = {}
+            for u, v, data in graph.edges(data=True):
+                table[u, v] = get_dynamic_edge_weight(u, v, data)
+                if not graph.is_directed():
+                    table[v, u] = table[u, v]
+            tables[key] = table
+            if len(tables) > MAX_EFFECTIVE_WEIGHT_TABLES:
+                tables.popitem(last=False)
+        else:
+            tables.move_to_end(key)
+
+    def weight(u, v, _data):
+        return table[u, v]
+
+    return weight
+
+def invalidate_effective_weights(graph):
+    """Drops the effective-weight tables built by effective_weight_function (e.g. after traffic data changes)."""
+    with _effective_weights_lock:
+        graph.graph.pop("effective_weights", None)
+
 def a_star_emergency_path(graph, source, target, weight_key="distance_km", 
                             time_dependent=False, time_of_day=None, 
-                            emergency_priority_factor=1.0):
+                            emergency_priority_factor=1.0, effective_weights=None):
     """
     Finds the shortest path using A* for emergency services.
     Args:
@@ -97,6 +460,8 @@ def a_star_emergency_path(graph, source, target, weight_key="distance_km",
         time_of_day (str): "morning_peak", "afternoon", "evening_peak", or "night".
         emergency_priority_factor (float): Factor to adjust perceived travel time/distance for emergency.
                                            Values < 1 make path appear shorter/faster.
+        effective_weights (np.ndarray): Optional precomputed build_effective_weights() array for this
+                                        time_of_day and priority, reused across queries.
     Returns:
         list: List of nodes in the shortest path, or None.
         float: Total path length (effective, considering priority), or None.
@@ -105,44 +470,81 @@ def a_star_emergency_path(graph, source, target, weight_key="distance_km",
         print("Error: Invalid graph or source/target node for A*.")
         return None, None
 
-    def get_dynamic_edge_weight(u, v, data):
-        base_weight = data.get(weight_key, float("inf"))
-        effective_weight = base_weight
+    csr = graph.graph.get("csr")
+    if njit is not None and csr is not None and weight_key == "distance_km":
+        # Run the compiled kernel on the precomputed arrays
+        if effective_weights is None:
+            effective_weights = build_effective_weights(csr, time_of_day if time_dependent else None,
+                                                        emergency_priority_factor)
+        idx2id = csr.idx2id
+        src, tgt = csr.id2idx[source], csr.id2idx[target]
+        h_f = heuristic_array(csr, tgt, emergency_priority_factor)
+        h_b = heuristic_array(csr, src, emergency_priority_factor)
+        prev_f, prev_b, edge_f, edge_b, meet = _bidir_astar_csr(
+            csr.indptr, csr.indices, csr.rev_indptr, csr.rev_indices, csr.rev_edge,
+            effective_weights, h_f, h_b, src, tgt)
+        if meet == -1:
+            print(f"No A* path found between {source} and {target}.")
+            return None, None
+        # Stitch src -> meet (forward tree) and meet -> tgt (backward tree)
+        nodes, edges = [meet], []
+        i = meet
+        while i != src:
+            edges.append(edge_f[i])
+            i = prev_f[i]
+            nodes.append(i)
+        nodes.reverse()
+        edges.reverse()
+        i = meet
+        while i != tgt:
+            edges.append(edge_b[i])
+            i = prev_b[i]
+            nodes.append(i)
+        # Sum along the path so the length matches the forward search's accumulation exactly
+        length = 0.0
+        for k in edges:
+            length += effective_weights[k]
+        return [idx2id[i] for i in nodes], float(length)
 
-        if time_dependent and time_of_day:
-            traffic_col_map = {
-                "morning_peak": "morning_peak_veh_h",
-                "afternoon": "afternoon_veh_h",
-                "evening_peak": "evening_peak_veh_h",
-                "night": "night_veh_h"
-            }
-            traffic_attr = traffic_col_map.get(time_of_day)
-            if traffic_attr and traffic_attr in data:
-                traffic_flow = data[traffic_attr]
-                capacity = data.get("base_capacity_veh_hr", 1)
-                if capacity == 0: capacity = 1
-                
-                # For emergency, high congestion might be less of a deterrent or handled differently
-                # Simple model: still consider congestion but perhaps less impactful than normal routing
-                congestion_factor = 1 + (traffic_flow / (capacity * 1.5)) # Assume emergency can bypass some congestion
-                congestion_factor = min(congestion_factor, 3.0) # Cap factor
-                effective_weight = base_weight * congestion_factor
-        
-        # Apply emergency priority factor
-        return effective_weight * emergency_priority_factor
+    weight = effective_weight_function(graph, weight_key, time_dependent, time_of_day, emergency_priority_factor)
+
+    csr = graph.graph.get("csr")
+    if csr is not None:
+        # Heuristic for every node from the parsed coordinate array in one pass
+        h_values = heuristic_array(csr, csr.id2idx[target], emergency_priority_factor).tolist()
+        id2idx = csr.id2idx
+
+        def h(u, _v):
+            return h_values[id2idx[u]]
+    else:
+        # The target is fixed for the whole query, so each node's heuristic value only needs computing once
+        target_data = graph.nodes[target]
+        tx = target_data.get("X_coordinate")
+        ty = target_data.get("Y_coordinate")
+        h_cache = {}
+
+        def h(u, _v):
+            r = h_cache.get(u)
+            if r is None:
+                node_data = graph.nodes[u]
+                x = node_data.get("X_coordinate")
+                y = node_data.get("Y_coordinate")
+                if x is None or y is None or tx is None or ty is None:
+                    r = 0 # Default if coordinates are missing
+                else:
+                    dx = x - tx
+                    dy = y - ty
+                    r = math.sqrt(dx*dx + dy*dy) * emergency_priority_factor
+                h_cache[u] = r
+            return r
 
     try:
         path = nx.astar_path(graph, source, target, 
-                             heuristic=lambda u,v: heuristic_distance(graph, u,v) * emergency_priority_factor,
-                             weight=lambda u,v,data: get_dynamic_edge_weight(u,v,data))
+                             heuristic=h,
+                             weight=weight)
         
-        # Calculate actual path length based on the dynamic weights used
-        length = 0
-        for i in range(len(path) - 1):
-            u_node, v_node = path[i], path[i+1]
-            edge_data = graph.get_edge_data(u_node, v_node)
-            length += get_dynamic_edge_weight(u_node, v_node, edge_data)
-            
+        # Calculate actual path length based on the effective weights used
+        length = sum(weight(path[i], path[i+1], None) for i in range(len(path) - 1))
         return path, length
     except nx.NetworkXNoPath:
         print(f"No A* path found between {source} and {target}.")
@@ -151,26 +553,71 @@ def a_star_emergency_path(graph, source, target, weight_key="distance_km",
         print(f"Error in A* emergency path: {e}")
         return None, None
 
+def closest_emergency_path(graph, sources, targets, weight_key="distance_km",
+                           time_dependent=False, time_of_day=None,
+                           emergency_priority_factor=1.0, effective_weights=None):
+    """
+    Finds the shortest path from any node in sources to the nearest node in targets with a single
+    multi-source Dijkstra search, instead of one A* query per (source, target) pair.
+    Arguments are as for a_star_emergency_path.
+    Returns:
+        list: Path from the chosen source (path[0]) to the chosen target (path[-1]), or None.
+        float: Total path length (effective, considering priority), or None.
+    """
+    sources = [s for s in sources if graph.has_node(s)]
+    targets = [t for t in targets if graph.has_node(t)]
+    if not sources or not targets:
+        return None, None
+
+    csr = graph.graph.get("csr")
+    if njit is not None and csr is not None and weight_key == "distance_km":
+        id2idx, idx2id = csr.id2idx, csr.idx2id
+        if effective_weights is None:
+            effective_weights = build_effective_weights(csr, time_of_day if time_dependent else None,
+                                                        emergency_priority_factor)
+        is_target = np.zeros(len(idx2id), dtype=np.bool_)
+        is_target[[id2idx[t] for t in targets]] = True
+        src_idx = np.array([id2idx[s] for s in sources], dtype=np.int64)
+        g, prev, hit = _dijkstra_csr(csr.indptr, csr.indices, effective_weights, src_idx, is_target)
+        if hit == -1:
+            return None, None
+        path = []
+        i = hit
+        while i != -1:
+            path.append(idx2id[i])
+            i = prev[i]
+        path.reverse()
+        return path, float(g[hit])
+
+    weight = effective_weight_function(graph, weight_key, time_dependent, time_of_day, emergency_priority_factor)
+    dist, paths = nx.multi_source_dijkstra(graph, set(sources), weight=weight)
+    best = min((t for t in targets if t in dist), key=dist.__getitem__, default=None)
+    if best is None:
+        return None, None
+    return paths[best], dist[best]
+
 def analyze_path_options(graph, source, target):
     """Analyze and print all possible paths between two nodes."""
     print(f"\nAnalyzing all possible paths between {source} and {target}:")
     try:
+        dist_map = nx.get_edge_attributes(graph, "distance_km")
         # Try Dijkstra first as it's usually faster
         try:
             dijkstra_path = nx.dijkstra_path(graph, source, target, weight="distance_km")
-            dist = sum(graph[dijkstra_path[i]][dijkstra_path[i+1]].get("distance_km",0) 
+            dist = sum(dist_map.get((dijkstra_path[i], dijkstra_path[i+1]), 0)
                       for i in range(len(dijkstra_path)-1))
             print(f"Dijkstra shortest path: {dijkstra_path}")
             print(f"Distance: {dist:.2f} km")
         except nx.NetworkXNoPath:
             print("No path found using Dijkstra's algorithm")
             
-        # Try to find all simple paths (limited to prevent excessive computation)
-        paths = list(nx.shortest_simple_paths(graph, source, target, weight="distance_km"))
+        # Take only the 5 shortest simple paths; the generator (Yen's algorithm) stops there
+        # instead of enumerating every simple path, which is exponential in the worst case
+        paths = list(itertools.islice(nx.shortest_simple_paths(graph, source, target, weight="distance_km"), 5))
         if paths:
             print(f"\nFound paths (ordered by distance):")
-            for i, path in enumerate(paths[:5], 1):  # Show top 5 paths
-                dist = sum(graph[path[i]][path[i+1]].get("distance_km",0) 
+            for i, path in enumerate(paths, 1):
+                dist = sum(dist_map.get((path[i], path[i+1]), 0)
                           for i in range(len(path)-1))
                 print(f"Path {i}: {path}, Distance: {dist:.2f} km")
         else:
@@ -225,8 +672,6 @@ if __name__ == "__main__":
         if not emergency_graph_net.has_node(source_loc) or not emergency_graph_net.has_node(target_hospital):
             print(f"Source ({source_loc}) or Target ({target_hospital}) node not in graph.")
         else:
-            analyze_path_options(emergency_graph_net, source_loc, target_hospital)
-            
             print(f"\nRouting from {emergency_graph_net.nodes[source_loc].get('Name', source_loc)} to {emergency_graph_net.nodes[target_hospital].get('Name', target_hospital)}")
             
             # Try to find paths using different algorithms
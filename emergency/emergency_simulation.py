@@ -1,27 +1,53 @@
 import json
+import os
+import shutil
+import subprocess
+import tempfile
 import networkx as nx
 import random
-import matplotlib.pyplot as plt
+import numpy as np
+# Frames are only written to files, so the renderer draws on an Agg canvas directly rather than
+# switching the pyplot backend for every process that imports this module
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
 
 # Assuming astar_emergency.py is in the same directory or accessible via sys.path
-from astar_emergency import get_emergency_graph, a_star_emergency_path 
+from astar_emergency import get_emergency_graph, closest_emergency_path, build_effective_weights
 
 # --- Emergency Simulation (Conceptual) ---
 class EmergencySimulator:
+    # With more than dispatch_prune_min_vehicles vehicle locations to choose from, dispatch only searches
+    # from those whose straight-line distance to the incident is within dispatch_prune_factor of the
+    # closest one (None disables this). It is a heuristic cut: a vehicle that is farther in a straight
+    # line but much closer by road can be skipped, so small fleets are always searched exactly.
+    dispatch_prune_factor = 1.5
+    dispatch_prune_min_vehicles = 8
+
     def __init__(self, graph, num_incidents=5, simulation_steps=50):
-        self.graph = graph.copy()
+        # Shared with the caller rather than copied: no method changes the graph's nodes, edges or their
+        # data. The routing helpers only add derived caches under graph.graph, which nx.freeze would not
+        # block anyway, so the graph is not frozen either.
+        self.graph = graph
         self.num_incidents = num_incidents
         self.simulation_steps = simulation_steps
         self.incidents = [] # List of active incidents
         self.emergency_vehicles = [] # List of emergency vehicles
         self.history = [] # To store state for visualization
-        self.medical_facilities = [node for node, data in self.graph.nodes(data=True) if data.get("Type") == "Medical"]
+        self._medical_facility_nodes = tuple(node for node, data in self.graph.nodes(data=True) if data.get("Type") == "Medical")
+        self.medical_facilities = frozenset(self._medical_facility_nodes)
+        # Candidate incident locations: any node that is not itself a hospital, when there are any
+        self._incident_nodes = tuple(n for n in self.graph.nodes() if n not in self.medical_facilities) or tuple(self.graph.nodes())
+        self._effective_weights = {} # (time_of_day, priority) -> per-edge A* weight array
+        self._path_cache = {} # (sources, targets, time_of_day, priority) -> (path, length), reset every step
+        self._nearest_facility = {} # (node, time_of_day) -> path to the closest medical facility
         self.initialize_vehicles(num_vehicles=num_incidents) # Assume one vehicle per potential incident initially
 
     def initialize_vehicles(self, num_vehicles=5):
         # For simplicity, assume vehicles start at or near medical facilities or central dispatch points
         # Here, let them start at random medical facilities if available, else random nodes
-        start_nodes = self.medical_facilities if self.medical_facilities else list(self.graph.nodes())
+        start_nodes = self._medical_facility_nodes if self._medical_facility_nodes else list(self.graph.nodes())
         if not start_nodes: return
 
         for i in range(num_vehicles):
@@ -36,16 +62,44 @@ class EmergencySimulator:
                 "payload": False # True if carrying patient
             })
 
+    def effective_weights(self, time_of_day, priority):
+        """Per-edge A* weights for this time of day and priority, computed once and shared by every query."""
+        key = (time_of_day, priority)
+        if key not in self._effective_weights:
+            csr = self.graph.graph.get("csr")
+            self._effective_weights[key] = None if csr is None else build_effective_weights(csr, time_of_day, priority)
+        return self._effective_weights[key]
+
+    def _cached_search(self, sources, targets, time_of_day, priority):
+        """closest_emergency_path, reusing results for identical queries within the current step."""
+        key = (frozenset(sources), frozenset(targets), time_of_day, round(priority, 2))
+        result = self._path_cache.get(key)
+        if result is None:
+            result = closest_emergency_path(self.graph, sources, targets, time_dependent=True,
+                                            time_of_day=time_of_day, emergency_priority_factor=priority,
+                                            effective_weights=self.effective_weights(time_of_day, priority))
+            self._path_cache[key] = result
+        return result
+
+    def nearest_facility_path(self, node, time_of_day):
+        """
+        Path from node to the closest medical facility. Edge weights only depend on the time of day,
+        so results are kept for the whole simulation; incident locations recur often.
+        """
+        if node in self.medical_facilities:
+            return [node]
+        key = (node, time_of_day)
+        if key not in self._nearest_facility:
+            self._nearest_facility[key], _ = self._cached_search(
+                [node], self._medical_facility_nodes, time_of_day, 0.7) # Higher priority with payload
+        return self._nearest_facility[key]
+
     def generate_incident(self, step):
         # Generate a new incident periodically or based on some probability
         if random.random() < 0.1 and len(self.incidents) < self.num_incidents * 2: # Limit active incidents
-            incident_node = random.choice(list(self.graph.nodes()))
+            if not self._incident_nodes: return # No suitable node for incident
             # Ensure incident is not at a medical facility itself
-            if incident_node in self.medical_facilities and len(list(self.graph.nodes())) > len(self.medical_facilities):
-                possible_incident_nodes = [n for n in list(self.graph.nodes()) if n not in self.medical_facilities]
-                if possible_incident_nodes:
-                    incident_node = random.choice(possible_incident_nodes)
-                else: return # No suitable node for incident
+            incident_node = random.choice(self._incident_nodes)
             
             new_incident = {
                 "id": f"INC{step}_{len(self.incidents)}",
@@ -55,26 +109,33 @@ class EmergencySimulator:
                 "assigned_vehicle": None
             }
             self.incidents.append(new_incident)
-            print(f"Step {step}: New incident {new_incident["id"]} at {self.graph.nodes[incident_node].get("Name", incident_node)}")
+            print(f"Step {step}: New incident {new_incident['id']} at {self.graph.nodes[incident_node].get('Name', incident_node)}")
+
+    def _dispatch_candidates(self, vehicle_nodes, incident_node):
+        """Vehicle locations worth searching from, pruned by straight-line distance to the incident."""
+        csr = self.graph.graph.get("csr")
+        if csr is None or self.dispatch_prune_factor is None or len(vehicle_nodes) <= self.dispatch_prune_min_vehicles:
+            return vehicle_nodes
+        nodes = list(vehicle_nodes)
+        xy, id2idx = csr.xy, csr.id2idx
+        d = np.linalg.norm(xy[[id2idx[n] for n in nodes]] - xy[id2idx[incident_node]], axis=1)
+        if np.isnan(d).all():
+            return vehicle_nodes
+        # Vehicles without coordinates (NaN) cannot be bounded, so they are kept
+        keep = ~(d > self.dispatch_prune_factor * np.nanmin(d))
+        return [n for n, k in zip(nodes, keep) if k]
 
     def dispatch_vehicle(self, incident, current_time_of_day):
         available_vehicles = [v for v in self.emergency_vehicles if v["status"] == "available"]
         if not available_vehicles: return False
 
-        # Find closest available vehicle (simplistic: by current node distance to incident)
-        # A more complex dispatch would consider travel time using A*
+        # Find the available vehicle with the shortest travel time to the incident, searching
+        # from all vehicle locations at once rather than running A* once per vehicle
         best_vehicle = None
-        shortest_path_to_incident = None
-        min_len_to_incident = float("inf")
-
-        for vehicle in available_vehicles:
-            path, length = a_star_emergency_path(self.graph, vehicle["current_node"], incident["location"],
-                                                 time_dependent=True, time_of_day=current_time_of_day,
-                                                 emergency_priority_factor=0.8)
-            if path and length < min_len_to_incident:
-                min_len_to_incident = length
-                shortest_path_to_incident = path
-                best_vehicle = vehicle
+        candidate_nodes = self._dispatch_candidates({v["current_node"] for v in available_vehicles}, incident["location"])
+        shortest_path_to_incident, _ = self._cached_search(candidate_nodes, [incident["location"]], current_time_of_day, 0.8)
+        if shortest_path_to_incident:
+            best_vehicle = next(v for v in available_vehicles if v["current_node"] == shortest_path_to_incident[0])
         
         if best_vehicle and shortest_path_to_incident:
             best_vehicle["status"] = "enroute_to_incident"
@@ -83,11 +144,12 @@ class EmergencySimulator:
             best_vehicle["path_index"] = 0
             incident["status"] = "vehicle_assigned"
             incident["assigned_vehicle"] = best_vehicle["id"]
-            print(f"Dispatch: Vehicle {best_vehicle["id"]} assigned to incident {incident["id"]}.")
+            print(f"Dispatch: Vehicle {best_vehicle['id']} assigned to incident {incident['id']}.")
             return True
         return False
 
     def step_simulation(self, step_num, current_time_of_day):
+        self._path_cache.clear()
         self.generate_incident(step_num)
 
         # Dispatch to pending incidents
@@ -110,23 +172,17 @@ class EmergencySimulator:
                     vehicle["payload"] = True # Picked up patient
                     # Find path to closest medical facility
                     closest_facility_node = None
-                    min_len_to_facility = float("inf")
                     path_to_facility = None
 
                     if not self.medical_facilities:
-                        print(f"Warning: No medical facilities defined for vehicle {vehicle["id"]}.")
+                        print(f"Warning: No medical facilities defined for vehicle {vehicle['id']}.")
                         vehicle["status"] = "available" # Or stuck
                         vehicle["payload"] = False
                         continue
                         
-                    for facility_node in self.medical_facilities:
-                        path, length = a_star_emergency_path(self.graph, vehicle["current_node"], facility_node,
-                                                             time_dependent=True, time_of_day=current_time_of_day,
-                                                             emergency_priority_factor=0.7) # Higher priority with payload
-                        if path and length < min_len_to_facility:
-                            min_len_to_facility = length
-                            path_to_facility = path
-                            closest_facility_node = facility_node
+                    path_to_facility = self.nearest_facility_path(vehicle["current_node"], current_time_of_day)
+                    if path_to_facility:
+                        closest_facility_node = path_to_facility[-1]
                     
                     if path_to_facility:
                         vehicle["status"] = "enroute_to_facility"
@@ -137,10 +193,10 @@ class EmergencySimulator:
                         for inc in self.incidents:
                             if inc["assigned_vehicle"] == vehicle["id"] and inc["status"] == "vehicle_assigned":
                                 inc["status"] = "resolved" # Or enroute_hospital
-                                print(f"Incident {inc["id"]} patient picked up by {vehicle["id"]}, enroute to {self.graph.nodes[closest_facility_node].get("Name", closest_facility_node)}.")
+                                print(f"Incident {inc['id']} patient picked up by {vehicle['id']}, enroute to {self.graph.nodes[closest_facility_node].get('Name', closest_facility_node)}.")
                                 break
                     else:
-                        print(f"Vehicle {vehicle["id"]} could not find path to facility from {vehicle["current_node"]}.")
+                        print(f"Vehicle {vehicle['id']} could not find path to facility from {vehicle['current_node']}.")
                         vehicle["status"] = "available" # Or stuck
                         vehicle["payload"] = False
                 
@@ -148,7 +204,7 @@ class EmergencySimulator:
                     vehicle["current_node"] = vehicle["facility_target"]
                     vehicle["status"] = "at_facility" # Could become available after a delay
                     vehicle["payload"] = False
-                    print(f"Vehicle {vehicle["id"]} arrived at facility {self.graph.nodes[vehicle["facility_target"]].get("Name", vehicle["facility_target"])}.")
+                    print(f"Vehicle {vehicle['id']} arrived at facility {self.graph.nodes[vehicle['facility_target']].get('Name', vehicle['facility_target'])}.")
                     # Make vehicle available again after a short delay (e.g. next step)
                     # For now, make available immediately for simplicity in this step-based sim
                     vehicle["status"] = "available"
@@ -178,56 +234,153 @@ class EmergencySimulator:
         return self.history
 
 # --- Visualization of Emergency Simulation (Conceptual) ---
-def visualize_emergency_step(graph, sim_state, output_dir=r"c:\Users\abdoo\Desktop\transportation_system\output\visualizations\emergency_sim_frames"):
-    fig, ax = plt.subplots(figsize=(14,11))
-    pos = {node: (data.get("X_coordinate", random.random()), data.get("Y_coordinate", random.random())) 
-           for node, data in graph.nodes(data=True)}
-    
-    nx.draw_networkx_nodes(graph, pos, ax=ax, node_size=30, node_color="lightgray", alpha=0.5)
-    nx.draw_networkx_edges(graph, pos, ax=ax, edge_color="gray", alpha=0.3)
-    # nx.draw_networkx_labels(graph, pos, ax=ax, font_size=7, alpha=0.7)
-
-    # Draw incidents
-    incident_nodes = [inc["location"] for inc in sim_state["incidents"] if inc["status"] != "resolved"]
-    if incident_nodes:
-        nx.draw_networkx_nodes(graph, pos, nodelist=incident_nodes, ax=ax, node_size=100, node_color="red", node_shape="X", label="Incidents")
-
-    # Draw medical facilities
-    facility_nodes = [node for node, data in graph.nodes(data=True) if data.get("Type") == "Medical"]
-    if facility_nodes:
-        nx.draw_networkx_nodes(graph, pos, nodelist=facility_nodes, ax=ax, node_size=120, node_color="green", node_shape="s", label="Hospitals")
-
-    # Draw vehicles and their paths
-    for veh in sim_state["vehicles"]:
-        node_color = "blue"
-        if veh["status"] == "enroute_to_incident": node_color = "orange"
-        elif veh["status"] == "enroute_to_facility": node_color = "purple"
-        elif veh["status"] == "at_facility": node_color = "darkgreen"
-        
-        nx.draw_networkx_nodes(graph, pos, nodelist=[veh["current_node"]], ax=ax, node_size=80, node_color=node_color, node_shape="^")
-        # Draw vehicle path if it exists (from original astar_emergency.py or current vehicle path)
-        # This part needs vehicle to store its current full path for visualization
-        # The current `vehicle["path"]` is the one it is following.
-        if veh.get("path") and len(veh["path"]) > 1:
-            path_edges = list(zip(veh["path"][:-1], veh["path"][1:]))
-            nx.draw_networkx_edges(graph, pos, edgelist=path_edges, ax=ax, edge_color=node_color, width=2.0, style="dashed")
-
-    plt.title(f"Emergency Simulation - Step {sim_state["step"]} ({sim_state["time_of_day"]})")
-    # Create a simple legend
-    legend_elements = [
-        plt.Line2D([0], [0], marker="X", color="w", label="Incident", markerfacecolor="red", markersize=10),
-        plt.Line2D([0], [0], marker="s", color="w", label="Hospital", markerfacecolor="green", markersize=10),
-        plt.Line2D([0], [0], marker="^", color="w", label="EV (Available)", markerfacecolor="blue", markersize=8),
-        plt.Line2D([0], [0], marker="^", color="w", label="EV (To Incident)", markerfacecolor="orange", markersize=8),
-        plt.Line2D([0], [0], marker="^", color="w", label="EV (To Hospital)", markerfacecolor="purple", markersize=8),
-    ]
-    ax.legend(handles=legend_elements, loc="upper right")
-    plt.axis("off")
-    
-    import os
+def node_positions(graph):
+    return {node: (data.get("X_coordinate", random.random()), data.get("Y_coordinate", random.random())) 
+            for node, data in graph.nodes(data=True)}
+
+VEHICLE_STATUS_COLORS = {
+    "available": "blue",
+    "enroute_to_incident": "orange",
+    "enroute_to_facility": "purple",
+    "at_facility": "darkgreen",
+}
+
+class EmergencyFrameRenderer:
+    """
+    Draws simulation frames on one reusable figure. The road network, hospitals and legend are drawn
+    once; each frame only moves the incident and vehicle markers and replaces the vehicle paths.
+    """
+    def __init__(self, graph, medical_facilities=None, pos=None):
+        self.pos = pos if pos is not None else node_positions(graph)
+        self.fig = Figure(figsize=(14,11))
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.subplots()
+        ax = self.ax
+
+        nx.draw_networkx_nodes(graph, self.pos, ax=ax, node_size=30, node_color="lightgray", alpha=0.5)
+        nx.draw_networkx_edges(graph, self.pos, ax=ax, edge_color="gray", alpha=0.3)
+        # nx.draw_networkx_labels(graph, self.pos, ax=ax, font_size=7, alpha=0.7)
+
+        # Draw medical facilities
+        if medical_facilities is None:
+            medical_facilities = [node for node, data in graph.nodes(data=True) if data.get("Type") == "Medical"]
+        facility_nodes = list(medical_facilities)
+        if facility_nodes:
+            nx.draw_networkx_nodes(graph, self.pos, nodelist=facility_nodes, ax=ax, node_size=120, node_color="green", node_shape="s", label="Hospitals")
+
+        # Per-frame artists, updated in place by draw()
+        self.incidents = ax.scatter(np.empty(0), np.empty(0), s=100, c="red", marker="X", zorder=3)
+        self.paths = LineCollection([], linewidths=2.0, linestyles="dashed", zorder=2)
+        ax.add_collection(self.paths)
+        self.vehicles = ax.scatter(np.empty(0), np.empty(0), s=80, marker="^", zorder=4)
+        self.title = ax.set_title("")
+
+        # Create a simple legend
+        legend_elements = [
+            Line2D([0], [0], marker="X", color="w", label="Incident", markerfacecolor="red", markersize=10),
+            Line2D([0], [0], marker="s", color="w", label="Hospital", markerfacecolor="green", markersize=10),
+            Line2D([0], [0], marker="^", color="w", label="EV (Available)", markerfacecolor="blue", markersize=8),
+            Line2D([0], [0], marker="^", color="w", label="EV (To Incident)", markerfacecolor="orange", markersize=8),
+            Line2D([0], [0], marker="^", color="w", label="EV (To Hospital)", markerfacecolor="purple", markersize=8),
+        ]
+        ax.legend(handles=legend_elements, loc="upper right")
+        ax.axis("off")
+
+    def _offsets(self, nodes):
+        return np.array([self.pos[n] for n in nodes], dtype=float).reshape(-1, 2)
+
+    def draw(self, sim_state):
+        """Updates the per-frame artists to show sim_state."""
+        pos = self.pos
+        # Draw incidents
+        self.incidents.set_offsets(self._offsets(inc["location"] for inc in sim_state["incidents"] if inc["status"] != "resolved"))
+
+        # Draw vehicles and their paths
+        vehicles = sim_state["vehicles"]
+        colors = [VEHICLE_STATUS_COLORS.get(veh["status"], "blue") for veh in vehicles]
+        self.vehicles.set_offsets(self._offsets(veh["current_node"] for veh in vehicles))
+        self.vehicles.set_facecolors(colors)
+        # Paths are drawn only for states that include the vehicle's current path
+        segments, segment_colors = [], []
+        for veh, color in zip(vehicles, colors):
+            if veh.get("path") and len(veh["path"]) > 1:
+                for u, v in zip(veh["path"][:-1], veh["path"][1:]):
+                    segments.append([pos[u], pos[v]])
+                    segment_colors.append(color)
+        self.paths.set_segments(segments)
+        self.paths.set_color(segment_colors)
+
+        self.title.set_text(f"Emergency Simulation - Step {sim_state['step']} ({sim_state['time_of_day']})")
+
+    def save(self, sim_state, output_dir):
+        """Draws sim_state and writes it as a numbered PNG frame into an existing output_dir."""
+        self.draw(sim_state)
+        self.fig.savefig(f"{output_dir}emergency_sim_step_{sim_state['step']:03d}.png")
+
+    def write_frames(self, history, output_dir):
+        """Writes every state in history as a PNG frame."""
+        os.makedirs(output_dir, exist_ok=True)
+        for sim_state in history:
+            self.save(sim_state, output_dir)
+
+    def write_video(self, history, video_path, fps=5):
+        """
+        Streams every state in history straight into an H.264 MP4 by piping raw RGBA frames to ffmpeg,
+        so no intermediate PNGs are written and read back. Returns False if ffmpeg is not installed or
+        fails to produce the video (its error output is printed).
+        """
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            return False
+        os.makedirs(os.path.dirname(video_path) or ".", exist_ok=True)
+        self.fig.canvas.draw()
+        width, height = self.fig.canvas.get_width_height()
+        cmd = [ffmpeg, "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+               "-c:v", "libx264", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p", video_path]
+        # stderr goes to a file rather than a pipe, so ffmpeg can never block on it while we write frames
+        with tempfile.TemporaryFile() as ffmpeg_log, \
+             subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=ffmpeg_log) as proc:
+            try:
+                for sim_state in history:
+                    self.draw(sim_state)
+                    self.fig.canvas.draw()
+                    proc.stdin.write(self.fig.canvas.buffer_rgba())
+                proc.stdin.close()
+            except BrokenPipeError: # ffmpeg exited early (e.g. a build without libx264)
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+            proc.wait()
+            if proc.returncode != 0:
+                ffmpeg_log.seek(0)
+                print(f"ffmpeg failed with exit code {proc.returncode}: {ffmpeg_log.read().decode(errors='replace').strip()}")
+        return proc.returncode == 0
+
+    def close(self):
+        # The figure is not registered with pyplot, so releasing it only means dropping its artists
+        self.fig.clear()
+
+_step_renderer = None # ((graph, medical_facilities, pos), EmergencyFrameRenderer) of the last call
+
+def visualize_emergency_step(graph, sim_state, output_dir=r"c:\Users\abdoo\Desktop\transportation_system\output\visualizations\emergency_sim_frames",
+                             medical_facilities=None, pos=None):
+    # Consecutive calls for the same graph reuse one figure; call close_step_renderer() after the last frame
+    global _step_renderer
+    key = (graph, medical_facilities, pos)
+    if _step_renderer is None or any(a is not b for a, b in zip(_step_renderer[0], key)):
+        close_step_renderer()
+        _step_renderer = (key, EmergencyFrameRenderer(graph, medical_facilities, pos))
     os.makedirs(output_dir, exist_ok=True)
-    plt.savefig(f"{output_dir}emergency_sim_step_{sim_state["step"]:03d}.png")
-    plt.close(fig)
+    _step_renderer[1].save(sim_state, output_dir)
+
+def close_step_renderer():
+    """Releases the figure kept by visualize_emergency_step (a no-op if there is none)."""
+    global _step_renderer
+    if _step_renderer is not None:
+        _step_renderer[1].close()
+        _step_renderer = None
 
 if __name__ == "__main__":
     print("Testing Emergency Simulation (Conceptual)")
@@ -258,11 +411,17 @@ if __name__ == "__main__":
         em_history = em_simulator.run()
         
         print(f"Emergency simulation finished. Visualizing {len(em_history)} steps...")
-        for i, state_at_step in enumerate(em_history):
-            visualize_emergency_step(em_sim_graph, state_at_step, output_dir=sim_output_dir_em)
-        print(f"Emergency simulation frames saved to {sim_output_dir_em}")
-        print("To create a video (requires ffmpeg):")
-        print(f"ffmpeg -r 5 -i {sim_output_dir_em}emergency_sim_step_%03d.png -c:v libx264 -vf fps=10 -pix_fmt yuv420p {sim_output_dir_em}../emergency_simulation.mp4")
+        renderer = EmergencyFrameRenderer(em_sim_graph, medical_facilities=em_simulator.medical_facilities)
+        em_video_path = os.path.join(os.path.dirname(sim_output_dir_em), "emergency_simulation.mp4")
+        if renderer.write_video(em_history, em_video_path):
+            print(f"Emergency simulation video saved to {em_video_path}")
+        else:
+            renderer.write_frames(em_history, sim_output_dir_em)
+            print(f"Emergency simulation frames saved to {sim_output_dir_em}")
+            print("To create a video (requires ffmpeg):")
+            print(f"ffmpeg -r 5 -i {sim_output_dir_em}emergency_sim_step_%03d.png -c:v libx264 -vf fps=10 -pix_fmt yuv420p {sim_output_dir_em}../emergency_simulation.mp4")
+        renderer.close()
+        close_step_renderer()
     else:
         print("Failed to load graph for emergency simulation testing.")
 
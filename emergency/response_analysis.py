@@ -1,107 +1,193 @@
 import json
-import statistics
+import os
+from array import array
+import numpy as np
 
-# --- Data Loading (Shared logic - consider a common utility) ---
+try:
+    import orjson
+except ImportError:  # fall back to the standard library parser
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # iter_history loads the whole file instead of streaming it
+    ijson = None
+
+# --- Data Loading ---
 def load_json_data(file_path):
     try:
+        if orjson is not None:
+            with open(file_path, "rb") as f:
+                return orjson.loads(f.read())
         with open(file_path, "r") as f:
             return json.load(f)
     except FileNotFoundError:
         print(f"Error: Data file not found at {file_path}")
         return None
-    except json.JSONDecodeError:
+    except ValueError: # json.JSONDecodeError and orjson.JSONDecodeError
         print(f"Error: Could not decode JSON from {file_path}")
         return None
 
+def iter_history(file_path):
+    """
+    Yields the states of a saved simulation history (a JSON list) one step at a time.
+    With ijson the file is parsed incrementally, so memory stays bounded however long the history is.
+    """
+    if ijson is None:
+        yield from load_json_data(file_path) or ()
+        return
+    try:
+        with open(file_path, "rb") as f:
+            yield from ijson.items(f, "item")
+    except FileNotFoundError:
+        print(f"Error: Data file not found at {file_path}")
+    except ijson.JSONError:
+        print(f"Error: Could not decode JSON from {file_path}")
+
 # --- Emergency Response Analysis ---
-def analyze_emergency_response_times(simulation_history):
+# Columns of the per-incident timing array (row i is the i-th incident reported); -1 marks an event that has not happened (yet)
+REPORTED_STEP, ASSIGNED_STEP, ARRIVED_INCIDENT_STEP, ARRIVED_FACILITY_STEP, ASSIGNED_VEHICLE, LOCATION = range(6)
+NUM_TIMING_COLUMNS = 6
+
+def _intern(table, key):
+    """Maps a string id to a small int, assigning the next free int on first sight."""
+    idx = table.get(key)
+    if idx is None:
+        idx = table[key] = len(table)
+    return idx
+
+def _summary(values):
+    """Mean and median of an array('i') of step counts as Python floats, or (None, None) when it is empty."""
+    if not len(values):
+        return None, None
+    values = np.frombuffer(values, dtype=np.intc) # zero-copy view
+    return float(values.mean()), float(np.median(values))
+
+def _incident_details(incident_arr, incident_ids, vehicle_ids, node_ids):
+    """Rebuilds the per-incident timing dicts (only the events that happened) from the timing array."""
+    details = {}
+    for inc_id, row in zip(incident_ids, incident_arr.tolist()):
+        timings = {"reported_step": row[REPORTED_STEP], "location": node_ids[row[LOCATION]]}
+        if row[ASSIGNED_STEP] >= 0:
+            timings["assigned_step"] = row[ASSIGNED_STEP]
+            timings["assigned_vehicle"] = vehicle_ids[row[ASSIGNED_VEHICLE]]
+        if row[ARRIVED_INCIDENT_STEP] >= 0:
+            timings["vehicle_arrived_incident_step"] = row[ARRIVED_INCIDENT_STEP]
+        if row[ARRIVED_FACILITY_STEP] >= 0:
+            timings["vehicle_arrived_facility_step"] = row[ARRIVED_FACILITY_STEP]
+            timings["resolved_step"] = row[ARRIVED_FACILITY_STEP]
+        details[inc_id] = timings
+    return details
+
+def analyze_emergency_response_times(simulation_history, return_details=False):
     """
     Analyzes response times from emergency simulation history.
     Args:
-        simulation_history (list): A list of states from the EmergencySimulator.
+        simulation_history (iterable): The states from the EmergencySimulator, in step order.
+            Consumed in a single pass, so a generator such as iter_history() works.
+        return_details (bool): Also return the per-incident timings under "incident_details_timed".
     Returns:
         dict: Analysis results including average response times, etc.
+              The per-stage time lists are in the order the events occurred.
     """
-    if not simulation_history:
+    if simulation_history is None: # load_json_data() returns None for a missing or unreadable file
         return {"error": "Simulation history is empty."}
 
-    dispatch_times = [] # Time from incident report to vehicle assignment
-    arrival_at_incident_times = [] # Time from assignment to arrival at incident
-    arrival_at_facility_times = [] # Time from incident pickup to arrival at facility
-    total_resolution_times = [] # Time from incident report to arrival at facility
-
-    # Track incidents to calculate durations
-    incident_timings = {}
-    # incident_timings[incident_id] = {
-    # "reported_step": step,
-    # "assigned_step": step,
-    # "vehicle_arrived_incident_step": step,
-    # "vehicle_arrived_facility_step": step
-    # }
+    # One int32 row per incident (see the column constants above), grown by doubling.
+    # Location and vehicle ids are interned to ints.
+    incident_arr = np.full((64, NUM_TIMING_COLUMNS), -1, dtype=np.int32)
+    num_incidents = 0
+    incident_rows = {} # incident id -> row
+    vehicle_to_active_incident = {} # vehicle id -> row of the incident it is currently handling
+    vehicle_table = {}
+    node_table = {}
+    num_steps = 0
+    # Each latency is recorded the moment its closing event is seen, so no pass over the incidents follows.
+    # Arrival at the incident implies an assignment, and arrival at the facility implies a pickup,
+    # so only fully completed cycles count towards the facility and total resolution times.
+    dispatch_times = array("i") # Time from incident report to vehicle assignment
+    arrival_at_incident_times = array("i") # Time from assignment to arrival at incident
+    arrival_at_facility_times = array("i") # Time from incident pickup to arrival at facility
+    total_resolution_times = array("i") # Time from incident report to arrival at facility
 
     for step_data in simulation_history:
         step = step_data["step"]
-        
+        num_steps += 1
+
         # Track incident reporting and assignment
         for incident_sim in step_data.get("incidents", []):
             inc_id = incident_sim["id"]
-            if inc_id not in incident_timings:
-                incident_timings[inc_id] = {"reported_step": step, "location": incident_sim["location"]}
-            
-            if incident_sim.get("status") == "vehicle_assigned" and "assigned_step" not in incident_timings[inc_id]:
-                incident_timings[inc_id]["assigned_step"] = step
-                incident_timings[inc_id]["assigned_vehicle"] = incident_sim["assigned_vehicle"]
-                dispatch_time = step - incident_timings[inc_id]["reported_step"]
-                dispatch_times.append(dispatch_time)
+            row = incident_rows.get(inc_id)
+            if row is None:
+                if num_incidents == len(incident_arr):
+                    grown = np.full((2 * num_incidents, NUM_TIMING_COLUMNS), -1, dtype=np.int32)
+                    grown[:num_incidents] = incident_arr
+                    incident_arr = grown
+                row = incident_rows[inc_id] = num_incidents
+                num_incidents += 1
+                incident_arr[row, REPORTED_STEP] = step
+                incident_arr[row, LOCATION] = _intern(node_table, incident_sim["location"])
+
+            if incident_sim.get("status") == "vehicle_assigned" and incident_arr[row, ASSIGNED_STEP] < 0:
+                incident_arr[row, ASSIGNED_STEP] = step
+                incident_arr[row, ASSIGNED_VEHICLE] = _intern(vehicle_table, incident_sim["assigned_vehicle"])
+                vehicle_to_active_incident[incident_sim["assigned_vehicle"]] = row
+                dispatch_times.append(step - int(incident_arr[row, REPORTED_STEP]))
 
         # Track vehicle movements and arrivals
         for vehicle_sim in step_data.get("vehicles", []):
             veh_id = vehicle_sim["id"]
-            # Find incidents this vehicle was assigned to
-            for inc_id, inc_data in incident_timings.items():
-                if inc_data.get("assigned_vehicle") == veh_id:
-                    # Vehicle arrived at incident
-                    if vehicle_sim["current_node"] == inc_data["location"] and \
-                       vehicle_sim["status"] == "enroute_to_facility" and \
-                       "vehicle_arrived_incident_step" not in inc_data:
-                        inc_data["vehicle_arrived_incident_step"] = step
-                        if "assigned_step" in inc_data:
-                            time_to_incident = step - inc_data["assigned_step"]
-                            arrival_at_incident_times.append(time_to_incident)
-                    
-                    # Vehicle arrived at facility with payload
-                    if vehicle_sim["status"] == "at_facility" and \
-                       vehicle_sim["current_node"] == vehicle_sim["facility_target"] and \
-                       "vehicle_arrived_facility_step" not in inc_data and \
-                       inc_data.get("vehicle_arrived_incident_step") is not None: # Ensure patient was picked up
-                        inc_data["vehicle_arrived_facility_step"] = step
-                        time_to_facility = step - inc_data["vehicle_arrived_incident_step"]
-                        arrival_at_facility_times.append(time_to_facility)
-                        
-                        total_time = step - inc_data["reported_step"]
-                        total_resolution_times.append(total_time)
-                        inc_data["resolved_step"] = step # Mark as fully resolved for timing
-                        break # Vehicle handled one incident fully
-    
-    # Post-process incident_timings for any unresolved or partially resolved incidents if needed
-    # For now, we only count fully completed cycles for robust timing.
+            row = vehicle_to_active_incident.get(veh_id)
+            if row is None:
+                continue # Not handling an incident
+            timings = incident_arr[row]
+            status = vehicle_sim["status"]
+            # Vehicle arrived at incident (the location is compared as an interned node id)
+            if status == "enroute_to_facility":
+                if timings[ARRIVED_INCIDENT_STEP] < 0 and \
+                   node_table.get(vehicle_sim["current_node"], -1) == timings[LOCATION]:
+                    timings[ARRIVED_INCIDENT_STEP] = step
+                    arrival_at_incident_times.append(step - int(timings[ASSIGNED_STEP]))
+
+            # Vehicle arrived at facility with payload
+            elif status == "at_facility" and \
+                 vehicle_sim["current_node"] == vehicle_sim["facility_target"] and \
+                 timings[ARRIVED_FACILITY_STEP] < 0 and \
+                 timings[ARRIVED_INCIDENT_STEP] >= 0: # Ensure patient was picked up
+                timings[ARRIVED_FACILITY_STEP] = step
+                arrival_at_facility_times.append(step - int(timings[ARRIVED_INCIDENT_STEP]))
+                total_resolution_times.append(step - int(timings[REPORTED_STEP]))
+                del vehicle_to_active_incident[veh_id] # Vehicle handled one incident fully
+
+    if not num_steps:
+        return {"error": "Simulation history is empty."}
 
+    incident_arr = incident_arr[:num_incidents]
+    avg_dispatch, median_dispatch = _summary(dispatch_times)
+    avg_to_incident, median_to_incident = _summary(arrival_at_incident_times)
+    avg_to_facility, median_to_facility = _summary(arrival_at_facility_times)
+    avg_total, median_total = _summary(total_resolution_times)
+
+    # The latencies are unboxed C ints up to this point; they become lists only for the returned dict
     analysis = {
+        "num_steps_analyzed": num_steps,
         "num_incidents_processed_for_timing": len(total_resolution_times),
-        "dispatch_times_steps": dispatch_times,
-        "arrival_at_incident_times_steps": arrival_at_incident_times,
-        "arrival_at_facility_times_steps": arrival_at_facility_times,
-        "total_resolution_times_steps": total_resolution_times,
-        "avg_dispatch_time_steps": statistics.mean(dispatch_times) if dispatch_times else None,
-        "median_dispatch_time_steps": statistics.median(dispatch_times) if dispatch_times else None,
-        "avg_arrival_at_incident_time_steps": statistics.mean(arrival_at_incident_times) if arrival_at_incident_times else None,
-        "median_arrival_at_incident_time_steps": statistics.median(arrival_at_incident_times) if arrival_at_incident_times else None,
-        "avg_arrival_at_facility_time_steps": statistics.mean(arrival_at_facility_times) if arrival_at_facility_times else None,
-        "median_arrival_at_facility_time_steps": statistics.median(arrival_at_facility_times) if arrival_at_facility_times else None,
-        "avg_total_resolution_time_steps": statistics.mean(total_resolution_times) if total_resolution_times else None,
-        "median_total_resolution_time_steps": statistics.median(total_resolution_times) if total_resolution_times else None,
-        "incident_details_timed": incident_timings
+        "dispatch_times_steps": dispatch_times.tolist(),
+        "arrival_at_incident_times_steps": arrival_at_incident_times.tolist(),
+        "arrival_at_facility_times_steps": arrival_at_facility_times.tolist(),
+        "total_resolution_times_steps": total_resolution_times.tolist(),
+        "avg_dispatch_time_steps": avg_dispatch,
+        "median_dispatch_time_steps": median_dispatch,
+        "avg_arrival_at_incident_time_steps": avg_to_incident,
+        "median_arrival_at_incident_time_steps": median_to_incident,
+        "avg_arrival_at_facility_time_steps": avg_to_facility,
+        "median_arrival_at_facility_time_steps": median_to_facility,
+        "avg_total_resolution_time_steps": avg_total,
+        "median_total_resolution_time_steps": median_total
     }
+    if return_details:
+        analysis["incident_details_timed"] = _incident_details(
+            incident_arr, list(incident_rows), list(vehicle_table), list(node_table))
     return analysis
 
 if __name__ == "__main__":
@@ -114,9 +200,7 @@ if __name__ == "__main__":
     # Path to a potential simulation history file (replace with actual path if you save history from simulation)
     history_file_path = "/home/ubuntu/transportation_system/output/emergency_sim_history.json"
 
-    # Conceptual: If emergency_simulation.py saved its history to a JSON file:
-    # sim_history = load_json_data(history_file_path)
-
+    # If emergency_simulation.py saved its history to a JSON file, stream it step by step.
     # For this standalone test, let's create a small, dummy simulation history:
     dummy_history = [
         {"step": 0, "time_of_day": "morning_peak", "incidents": [{"id": "INC0_0", "location": "N1", "status": "pending_dispatch"}], "vehicles": [{"id": "EV0", "current_node": "H1", "status": "available"}]},
@@ -134,31 +218,33 @@ if __name__ == "__main__":
     # Save dummy history to a file to simulate loading (optional)
     # with open(history_file_path, "w") as f_hist:
     #     json.dump(dummy_history, f_hist, indent=4)
-    # sim_history_loaded = load_json_data(history_file_path)
-
-    sim_history_to_analyze = dummy_history # Use dummy history directly for this test
-
-    if sim_history_to_analyze:
-        print(f"Analyzing simulation history with {len(sim_history_to_analyze)} steps.")
-        analysis_results = analyze_emergency_response_times(sim_history_to_analyze)
-
-        if "error" in analysis_results:
-            print(f"Analysis Error: {analysis_results["error"]}")
-        else:
-            print("\n--- Emergency Response Analysis Results ---")
-            print(f"Number of Incidents Fully Timed: {analysis_results["num_incidents_processed_for_timing"]}")
-            print(f"Average Dispatch Time: {analysis_results["avg_dispatch_time_steps"]} steps")
-            print(f"Median Dispatch Time: {analysis_results["median_dispatch_time_steps"]} steps")
-            print(f"Average Time to Incident (from dispatch): {analysis_results["avg_arrival_at_incident_time_steps"]} steps")
-            print(f"Median Time to Incident (from dispatch): {analysis_results["median_arrival_at_incident_time_steps"]} steps")
-            print(f"Average Time to Facility (from incident): {analysis_results["avg_arrival_at_facility_time_steps"]} steps")
-            print(f"Median Time to Facility (from incident): {analysis_results["median_arrival_at_facility_time_steps"]} steps")
-            print(f"Average Total Resolution Time (report to facility): {analysis_results["avg_total_resolution_time_steps"]} steps")
-            print(f"Median Total Resolution Time (report to facility): {analysis_results["median_total_resolution_time_steps"]} steps")
-            
-            # print("\nIncident Timing Details:")
-            # for inc_id, timings in analysis_results["incident_details_timed"].items():
-            #     print(f"  Incident {inc_id}: {timings}")
+    # sim_history_loaded = iter_history(history_file_path)
+
+    if os.path.exists(history_file_path):
+        sim_history_to_analyze = iter_history(history_file_path)
     else:
+        sim_history_to_analyze = dummy_history # Use dummy history directly for this test
+
+    analysis_results = analyze_emergency_response_times(sim_history_to_analyze)
+
+    if "error" in analysis_results:
+        print(f"Analysis Error: {analysis_results['error']}")
         print(f"Could not load or use simulation history from {history_file_path} (or dummy history failed).")
+    else:
+        print(f"Analyzed simulation history with {analysis_results['num_steps_analyzed']} steps.")
+        print("\n--- Emergency Response Analysis Results ---")
+        print(f"Number of Incidents Fully Timed: {analysis_results['num_incidents_processed_for_timing']}")
+        print(f"Average Dispatch Time: {analysis_results['avg_dispatch_time_steps']} steps")
+        print(f"Median Dispatch Time: {analysis_results['median_dispatch_time_steps']} steps")
+        print(f"Average Time to Incident (from dispatch): {analysis_results['avg_arrival_at_incident_time_steps']} steps")
+        print(f"Median Time to Incident (from dispatch): {analysis_results['median_arrival_at_incident_time_steps']} steps")
+        print(f"Average Time to Facility (from incident): {analysis_results['avg_arrival_at_facility_time_steps']} steps")
+        print(f"Median Time to Facility (from incident): {analysis_results['median_arrival_at_facility_time_steps']} steps")
+        print(f"Average Total Resolution Time (report to facility): {analysis_results['avg_total_resolution_time_steps']} steps")
+        print(f"Median Total Resolution Time (report to facility): {analysis_results['median_total_resolution_time_steps']} steps")
+        
+        # Needs analyze_emergency_response_times(..., return_details=True)
+        # print("\nIncident Timing Details:")
+        # for inc_id, timings in analysis_results['incident_details_timed'].items():
+        #     print(f"  Incident {inc_id}: {timings}")
 
@@ -3,19 +3,85 @@ import networkx as nx
 import matplotlib.pyplot as plt
 import os
 import json
-import tempfile
-from kruskal_modified import get_infrastructure_graph, kruskal_mst_modified
+from kruskal_modified import load_json_data, get_infrastructure_graph, kruskal_mst_modified
 from cost_analysis import analyze_potential_road_costs, analyze_mst_cost
 from visualize import visualize_network_on_map
 
+def _file_version(path):
+    """Modification time of a data file (None if it is missing), used to key the caches below."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+@st.cache_resource(show_spinner=False)
+def _load_infrastructure_graph(road_data_file, facilities_data_file, data_version):
+    # data_version is only part of the cache key: editing either file rebuilds the graph on the next rerun
+    return get_infrastructure_graph(road_data_file, facilities_data_file)
+
+@st.cache_resource(show_spinner=False)
+def get_mst(_infra_graph, data_version, weight_key, consider_potential_roads, critical_facility_ids):
+    """MST of the cached graph, computed once per data version and parameter set (the result is only read)."""
+    return kruskal_mst_modified(
+        _infra_graph,
+        weight_key=weight_key,
+        consider_potential_roads=consider_potential_roads,
+        critical_facility_ids=list(critical_facility_ids)
+    )
+
+def _leading_number(text):
+    """First token of a report value such as "9770.00 M EGP" as a float."""
+    return float(text.split()[0])
+
+def parse_cost_summary_text(cost_summary_txt_path):
+    """
+    Rebuilds the "potential_road_costs" part of cost_summary.json from the cost_summary.txt report,
+    for checkouts where only the text report exists. Returns None if the report is missing.
+    """
+    try:
+        with open(cost_summary_txt_path, "r") as f:
+            cost_data = f.read()
+    except OSError:
+        return None
+
+    summary_fields = {
+        "Number of potential road projects:": "count",
+        "Total estimated cost:": "total_potential_cost_million_egp",
+        "Average cost per project:": "average_potential_cost_million_egp",
+        "Total distance of potential roads:": "total_potential_distance_km",
+        "Average distance per road:": "average_potential_distance_km",
+    }
+    potential_costs = {"potential_roads_list": []}
+    top_3_section = cost_data[cost_data.find("Top 3 Most Expensive Potential Roads:"):cost_data.find("Minimum Spanning Tree Analysis")]
+    for line in cost_data.split("\n"):
+        for label, key in summary_fields.items():
+            if line.startswith(label):
+                potential_costs[key] = _leading_number(line.split(":", 1)[1])
+    potential_costs["count"] = int(potential_costs.get("count", 0))
+
+    road = None
+    for line in top_3_section.split("\n"):
+        line = line.strip()
+        if line.startswith(("1.", "2.", "3.")) and "From" in line:
+            road = {"from": line.split("From")[1].split("to")[0].strip(), "to": line.split(" to ")[1].rstrip(":").strip()}
+            potential_costs["potential_roads_list"].append(road)
+        elif road is not None and line.startswith("Cost:"):
+            road["cost_million_egp"] = _leading_number(line.split(":", 1)[1])
+        elif road is not None and line.startswith("Distance:"):
+            road["distance_km"] = _leading_number(line.split(":", 1)[1])
+        elif road is not None and line.startswith("Estimated Capacity:"):
+            road["estimated_capacity"] = int(_leading_number(line.split(":", 1)[1]))
+    return {"potential_road_costs": potential_costs}
+
 def load_data():
     base_path = r"c:\Users\abdoo\Desktop\transportation_system\data"
     road_data_file = os.path.join(base_path, "road_data.json")
     facilities_data_file = os.path.join(base_path, "facilities.json")
-    
-    # Load graph
-    infra_graph = get_infrastructure_graph(road_data_file, facilities_data_file)
-    return infra_graph
+    data_version = (_file_version(road_data_file), _file_version(facilities_data_file))
+
+    # Load graph (built once per data version, not on every Streamlit rerun)
+    infra_graph = _load_infrastructure_graph(road_data_file, facilities_data_file, data_version)
+    return infra_graph, data_version
 
 def main():
     st.set_page_config(page_title="Infrastructure Analysis", layout="wide")
@@ -24,7 +90,7 @@ def main():
     st.write("Analyze and visualize the transportation network infrastructure")
 
     # Load data
-    infra_graph = load_data()
+    infra_graph, data_version = load_data()
     
     if not infra_graph:
         st.error("Failed to load infrastructure data")
@@ -37,97 +103,61 @@ def main():
         st.header("Minimum Spanning Tree Analysis")
         
         # Generate MST with default values
-        mst = kruskal_mst_modified(
+        mst = get_mst(
             infra_graph,
+            data_version,
             weight_key="distance_km",
             consider_potential_roads=True,
-            critical_facility_ids=["F3", "F4", "F5", "F6", "F9", "F10"]
+            critical_facility_ids=("F3", "F4", "F5", "F6", "F9", "F10")
         )
 
-        # Create and display interactive map
-        folium_map = visualize_network_on_map(infra_graph, mst)
-        
-        # Save the map to a temporary HTML file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.html') as tmp:
-            folium_map.save(tmp.name)
-            # Display the map using streamlit components
-            st.components.v1.html(open(tmp.name, 'r').read(), height=600)
-        
-        # Clean up the temporary file
-        os.unlink(tmp.name)
+        # Create and display interactive map; the rendered HTML is kept for the session and only
+        # regenerated when the data or the MST edge set changes
+        map_key = (data_version, frozenset(mst.edges()))
+        cached_map = st.session_state.get("infra_map")
+        if cached_map is None or cached_map[0] != map_key:
+            folium_map = visualize_network_on_map(infra_graph, mst)
+            cached_map = st.session_state["infra_map"] = (map_key, folium_map.get_root().render())
+        st.components.v1.html(cached_map[1], height=600)
 
     with tab2:
         st.header("Cost Analysis")
         
-        # Read the cost summary file
-        cost_summary_path = r"C:\Users\abdoo\Desktop\transportation_system\output\reports\cost_summary.txt"
-        with open(cost_summary_path, 'r') as f:
-            cost_data = f.read()
+        # Load the structured summary written by cost_analysis.py next to cost_summary.txt,
+        # falling back to parsing the text report when the JSON has not been generated
+        reports_path = r"C:\Users\abdoo\Desktop\transportation_system\output\reports"
+        cost_summary_path = os.path.join(reports_path, "cost_summary.json")
+        if os.path.exists(cost_summary_path):
+            cost_summary = load_json_data(cost_summary_path)
+        else:
+            cost_summary = parse_cost_summary_text(os.path.join(reports_path, "cost_summary.txt"))
+        if not cost_summary:
+            st.warning("Cost summary not available. Run cost_analysis.py to generate it.")
+            return
+        potential_costs = cost_summary["potential_road_costs"]
 
-        # Parse and display Potential Road Costs Summary
+        # Display Potential Road Costs Summary
         st.subheader("Potential Road Costs Summary")
-        summary_lines = [line for line in cost_data.split('\n') if line.strip()]
-        
-        # Extract metrics
-        metrics = {}
-        for line in summary_lines:
-            if "Number of potential road projects:" in line:
-                metrics["Number of Projects"] = int(line.split(":")[1].strip())
-            elif "Total estimated cost:" in line:
-                metrics["Total Cost"] = line.split(":")[1].strip()
-            elif "Average cost per project:" in line:
-                metrics["Average Cost/Project"] = line.split(":")[1].strip()
-            elif "Total distance of potential roads:" in line:
-                metrics["Total Distance"] = line.split(":")[1].strip()
-            elif "Average distance per road:" in line:
-                metrics["Average Distance/Road"] = line.split(":")[1].strip()
-
-        # Display metrics in columns
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Number of Projects", metrics["Number of Projects"])
-            st.metric("Total Cost", metrics["Total Cost"])
+            st.metric("Number of Projects", potential_costs["count"])
+            st.metric("Total Cost", f"{potential_costs['total_potential_cost_million_egp']:.2f} M EGP")
         with col2:
-            st.metric("Total Distance", metrics["Total Distance"])
-            st.metric("Average Cost/Project", metrics["Average Cost/Project"])
+            st.metric("Total Distance", f"{potential_costs['total_potential_distance_km']:.2f} km")
+            st.metric("Average Cost/Project", f"{potential_costs['average_potential_cost_million_egp']:.2f} M EGP")
         with col3:
-            st.metric("Average Distance/Road", metrics["Average Distance/Road"])
+            st.metric("Average Distance/Road", f"{potential_costs['average_potential_distance_km']:.2f} km")
 
         # Display Top 3 Most Expensive Roads
         st.subheader("Top 3 Most Expensive Potential Roads")
-        start_idx = cost_data.find("Top 3 Most Expensive Potential Roads:")
-        end_idx = cost_data.find("Minimum Spanning Tree Analysis")
-        top_3_section = cost_data[start_idx:end_idx].split('\n')
-        
-        current_road = {}
-        for line in top_3_section:
-            if line.startswith(('1.', '2.', '3.')):
-                if current_road:
-                    with st.expander(f"From {current_road['from']} to {current_road['to']}"):
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.metric("Cost", current_road['cost'])
-                            st.metric("Distance", current_road['distance'])
-                        with col2:
-                            st.metric("Capacity", current_road['capacity'])
-                current_road = {'from': line.split('From')[1].split('to')[0].strip(),
-                              'to': line.split('to')[1].strip()}
-            elif 'Cost:' in line:
-                current_road['cost'] = line.split('Cost:')[1].strip()
-            elif 'Distance:' in line:
-                current_road['distance'] = line.split('Distance:')[1].strip()
-            elif 'Estimated Capacity:' in line:
-                current_road['capacity'] = line.split('Estimated Capacity:')[1].strip()
-        
-        # Show last road
-        if current_road:
-            with st.expander(f"From {current_road['from']} to {current_road['to']}"):
+        for road in potential_costs["potential_roads_list"][:3]:
+            with st.expander(f"From {road['from']} to {road['to']}"):
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.metric("Cost", current_road['cost'])
-                    st.metric("Distance", current_road['distance'])
+                    st.metric("Cost", f"{road['cost_million_egp']:.2f} M EGP")
+                    st.metric("Distance", f"{road['distance_km']:.2f} km")
                 with col2:
-                    st.metric("Capacity", current_road['capacity'])
+                    st.metric("Capacity", f"{road['estimated_capacity']} vehicles/hour")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
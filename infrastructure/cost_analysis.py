@@ -1,19 +1,7 @@
 import json
 import networkx as nx
-import heapq
-
-# --- Data Loading ---
-def load_json_data(file_path):
-    """Loads data from a JSON file."""
-    try:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Data file not found at {file_path}")
-        return None
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from {file_path}")
-        return None
+import numpy as np
+from kruskal_modified import load_json_data, run_kruskal_select
 
 def get_infrastructure_graph_for_cost(road_data_path, facilities_data_path):
     """Constructs a graph focusing on attributes relevant for cost analysis."""
@@ -40,16 +28,14 @@ def get_infrastructure_graph_for_cost(road_data_path, facilities_data_path):
                 graph.nodes[facility_id].update(facility_info)
 
     if "edges" in road_data:
-        seen_edges = set()
         for edge_info in road_data["edges"]:
             u, v = str(edge_info["FromID"]), str(edge_info["ToID"])
-            edge_key = tuple(sorted([u, v]))
-            if edge_key in seen_edges:
+            # The graph is undirected, so this also catches the same road listed in the other direction
+            if graph.has_edge(u, v):
                 print(f"Warning: Duplicate edge found between {u} and {v}, ignoring duplicate")
                 continue
-            seen_edges.add(edge_key)
 
-            attributes = edge_info.copy()
+            attributes = edge_info # road_data is local to this function, so its edge dicts are updated in place
             if "Construction_Cost_Million_EGP" in attributes:
                 attributes["Construction_Cost_Million_EGP"] = float(attributes["Construction_Cost_Million_EGP"])
             if "Distance_km" in attributes:
@@ -68,27 +54,38 @@ def get_infrastructure_graph_for_cost(road_data_path, facilities_data_path):
 # --- Kruskal's Algorithm (Modified) ---
 def kruskal_mst_modified(graph, weight_key="distance_km", consider_potential_roads=False,
                          critical_facility_ids=None, high_population_threshold=100000,
-                         population_weight_factor=0.1):
-    """Finds a Minimum Spanning Tree using Kruskal's algorithm with modifications."""
+                         population_weight_factor=0.1, debug=False):
+    """Finds a Minimum Spanning Tree using Kruskal's algorithm with modifications.
+    With debug=True the connected components of the input graph are listed first."""
     if graph is None:
         return nx.Graph()
 
     mst = nx.Graph()
     mst.add_nodes_from(graph.nodes(data=True))
 
-    components = list(nx.connected_components(graph))
-    print(f"Number of connected components: {len(components)}")
-    for i, component in enumerate(components):
-        print(f"Component {i+1} has {len(component)} nodes: {', '.join(sorted(component))}")
-
-    edges = []
+    if debug:
+        components = list(nx.connected_components(graph))
+        print(f"Number of connected components: {len(components)}")
+        for i, component in enumerate(components):
+            print(f"Component {i+1} has {len(component)} nodes: {', '.join(sorted(component))}")
+
+    # Node ids are numbered in sorted order, so equal-weight edges are taken in node-name order
+    nodes = sorted(graph.nodes())
+    id_of = {node: i for i, node in enumerate(nodes)}
+    # Per-node lookups hoisted out of the edge loop, indexed by node id
+    critical = frozenset(critical_facility_ids or ())
+    is_critical = np.fromiter((node in critical for node in nodes), dtype=bool, count=len(nodes))
+    population = np.fromiter((graph.nodes[node].get("Population", 0) for node in nodes), dtype=np.float64, count=len(nodes))
+    # Per-edge inputs gathered in one pass (one list per field); the weights are then computed for all edges at once
+    edge_u, edge_v, base_weights, cost_penalties, edge_data = [], [], [], [], []
     for u, v, data in graph.edges(data=True):
-        if not consider_potential_roads and data.get("status") == "potential":
+        road_status = data.get("status")
+        if not consider_potential_roads and road_status == "potential":
             continue
 
         # Handle weight based on the weight_key
         if weight_key == "Construction_Cost_Million_EGP":
-            if data.get("status") == "existing":
+            if road_status == "existing":
                 # Add a small distance-based penalty to existing roads
                 original_weight = 0.0 + (float(data.get("distance_km", 0)) * 0.1)
             else:
@@ -102,47 +99,42 @@ def kruskal_mst_modified(graph, weight_key="distance_km", consider_potential_roa
                 continue
             original_weight = float(data[weight_key])
 
-        modified_weight = original_weight
-        if data.get("status") == "potential" and weight_key == "distance_km" and "Construction_Cost_Million_EGP" in data:
+        cost_penalty = 0.0
+        if road_status == "potential" and weight_key == "distance_km" and "Construction_Cost_Million_EGP" in data:
             cost_penalty = data["Construction_Cost_Million_EGP"] / 100
-            modified_weight = original_weight * (1 + cost_penalty)
-
-        priority_multiplier = 1.0
-        if critical_facility_ids and (u in critical_facility_ids or v in critical_facility_ids):
-            priority_multiplier *= 0.8
-        u_pop = graph.nodes[u].get("Population", 0)
-        v_pop = graph.nodes[v].get("Population", 0)
-        max_pop = max(u_pop, v_pop)
-        if max_pop > high_population_threshold and high_population_threshold > 0:
-            pop_factor = min(1.5, max_pop / high_population_threshold)
-            priority_multiplier *= (1 - (population_weight_factor * (pop_factor - 1)))
-
-        modified_weight *= priority_multiplier
-        heapq.heappush(edges, (modified_weight, u, v, data))
-
-    parent = {node: node for node in graph.nodes()}
-    def find_set(node):
-        if parent[node] != node:
-            parent[node] = find_set(parent[node])
-        return parent[node]
-
-    def unite_sets(u_set, v_set):
-        parent[u_set] = v_set
-
-    num_edges_in_mst = 0
+
+        edge_u.append(id_of[u])
+        edge_v.append(id_of[v])
+        base_weights.append(original_weight)
+        cost_penalties.append(cost_penalty)
+        edge_data.append(data)
+
+    edge_u = np.array(edge_u, dtype=np.int64)
+    edge_v = np.array(edge_v, dtype=np.int64)
+    base_weights = np.array(base_weights, dtype=np.float64)
+    cost_penalties = np.array(cost_penalties, dtype=np.float64)
+    weights = base_weights * (1 + cost_penalties)
+
+    # Priority multipliers: critical facility endpoints, then highly populated endpoints
+    priority_multiplier = np.where(is_critical[edge_u] | is_critical[edge_v], 0.8, 1.0)
+    if high_population_threshold > 0:
+        max_pop = np.maximum(population[edge_u], population[edge_v])
+        pop_factor = np.minimum(1.5, max_pop / high_population_threshold)
+        priority_multiplier *= np.where(max_pop > high_population_threshold,
+                                        1 - (population_weight_factor * (pop_factor - 1)), 1.0)
+    weights *= priority_multiplier
+
     target_num_edges = graph.number_of_nodes() - 1
     if graph.number_of_nodes() == 0:
         return mst
 
-    while edges and num_edges_in_mst < target_num_edges:
-        weight, u, v, edge_data = heapq.heappop(edges)
-        u_set, v_set = find_set(u), find_set(v)
-        if u_set != v_set:
-            mst.add_edge(u, v, **edge_data, modified_weight=weight)
-            unite_sets(u_set, v_set)
-            num_edges_in_mst += 1
-            if not nx.is_connected(mst) and num_edges_in_mst == target_num_edges:
-                break
+    # Take candidate edges in non-decreasing weight order (ties broken by node ids, which follow node-name order)
+    order = np.lexsort((edge_v, edge_u, weights))
+    accepted = run_kruskal_select(edge_u, edge_v, order, len(nodes), target_num_edges)
+    for k in accepted:
+        u, v, weight, data = nodes[edge_u[k]], nodes[edge_v[k]], float(weights[k]), edge_data[k]
+        mst.add_edge(u, v, **data, modified_weight=weight)
+    num_edges_in_mst = len(accepted)
 
     print(f"MST edges added: {num_edges_in_mst}")
     return mst
@@ -152,27 +144,32 @@ def analyze_potential_road_costs(graph):
     """Analyzes and summarizes costs of potential new roads."""
     if graph is None:
         return {}
+    # One bulk read per attribute, keyed by edge
+    status = nx.get_edge_attributes(graph, "status")
+    cost_attr = nx.get_edge_attributes(graph, "Construction_Cost_Million_EGP")
+    distance_attr = nx.get_edge_attributes(graph, "distance_km")
+    capacity_attr = nx.get_edge_attributes(graph, "Estimated_Capacity_vehicles_hour")
+    potential_edges = [edge for edge, edge_status in status.items() if edge_status == "potential"]
+    count = len(potential_edges)
+    costs = np.fromiter((cost_attr.get(edge, 0) for edge in potential_edges), dtype=np.float64, count=count)
+    distances = np.fromiter((distance_attr.get(edge, 0) for edge in potential_edges), dtype=np.float64, count=count)
+    total_potential_cost = float(costs.sum())
+    total_potential_distance = float(distances.sum())
+    # Most expensive first; the stable sort keeps graph order among equal costs
     potential_roads = []
-    total_potential_cost = 0
-    total_potential_distance = 0
-    count = 0
-    for u, v, data in graph.edges(data=True):
-        if data.get("status") == "potential":
-            cost = data.get("Construction_Cost_Million_EGP", 0)
-            distance = data.get("distance_km", 0)
-            potential_roads.append({
-                "from": u, "to": v, "cost_million_egp": cost, "distance_km": distance,
-                "estimated_capacity": data.get("Estimated_Capacity_vehicles_hour")
-            })
-            total_potential_cost += cost
-            total_potential_distance += distance
-            count += 1
+    for i in np.argsort(-costs, kind="stable").tolist():
+        edge = potential_edges[i]
+        potential_roads.append({
+            "from": edge[0], "to": edge[1], "cost_million_egp": cost_attr.get(edge, 0),
+            "distance_km": distance_attr.get(edge, 0),
+            "estimated_capacity": capacity_attr.get(edge)
+        })
     return {
         "count": count, "total_potential_cost_million_egp": total_potential_cost,
         "average_potential_cost_million_egp": total_potential_cost / count if count > 0 else 0,
         "total_potential_distance_km": total_potential_distance,
         "average_potential_distance_km": total_potential_distance / count if count > 0 else 0,
-        "potential_roads_list": sorted(potential_roads, key=lambda x: x["cost_million_egp"], reverse=True)
+        "potential_roads_list": potential_roads
     }
 
 def analyze_mst_cost(mst_graph, original_graph, cost_attribute="Construction_Cost_Million_EGP", distance_attribute="distance_km"):
@@ -194,7 +191,7 @@ def analyze_mst_cost(mst_graph, original_graph, cost_attribute="Construction_Cos
         })
 
     # Identify isolated nodes (nodes with degree 0 in the original graph)
-    isolated_nodes = [node for node in original_graph.nodes() if original_graph.degree(node) == 0]
+    isolated_nodes = list(nx.isolates(original_graph))
 
     return {
         "total_construction_cost_million_egp": total_cost,
@@ -208,61 +205,75 @@ if __name__ == "__main__":
     print("Testing Infrastructure Cost Analysis at 04:28 AM EEST on Monday, May 19, 2025")
     base_path = r"c:\Users\abdoo\Desktop\transportation_system\data"
     output_path = r"c:\Users\abdoo\Desktop\transportation_system\output\reports\cost_summary.txt"
+    summary_json_path = r"c:\Users\abdoo\Desktop\transportation_system\output\reports\cost_summary.json"
     road_data_file = base_path + r"\road_data.json"
     facilities_data_file = base_path + r"\facilities.json"
 
     infra_graph = get_infrastructure_graph_for_cost(road_data_file, facilities_data_file)
 
+    # The report is collected in memory and written in one call
+    report = []
+    write = report.append
+    if infra_graph:
+        write(f"Infrastructure Analysis Report\n")
+        write(f"===========================\n\n")
+        write(f"Network Overview:\n")
+        write(f"- Total nodes: {infra_graph.number_of_nodes()}\n")
+        write(f"- Total edges: {infra_graph.number_of_edges()}\n\n")
+
+        potential_costs_summary = analyze_potential_road_costs(infra_graph)
+        write("Potential Road Costs Summary\n")
+        write("---------------------------\n")
+        write(f"Number of potential road projects: {potential_costs_summary['count']}\n")
+        write(f"Total estimated cost: {potential_costs_summary['total_potential_cost_million_egp']:.2f} M EGP\n")
+        write(f"Average cost per project: {potential_costs_summary['average_potential_cost_million_egp']:.2f} M EGP\n")
+        write(f"Total distance of potential roads: {potential_costs_summary['total_potential_distance_km']:.2f} km\n")
+        write(f"Average distance per road: {potential_costs_summary['average_potential_distance_km']:.2f} km\n\n")
+
+        if potential_costs_summary["count"] > 0:
+            write("Top 3 Most Expensive Potential Roads:\n")
+            for i, road in enumerate(potential_costs_summary["potential_roads_list"][:3]):
+                write(f"{i+1}. From {road['from']} to {road['to']}:\n")
+                write(f"   Cost: {road['cost_million_egp']:.2f} M EGP\n")
+                write(f"   Distance: {road['distance_km']:.2f} km\n")
+                write(f"   Estimated Capacity: {road['estimated_capacity']} vehicles/hour\n\n")
+
+        if infra_graph.number_of_edges() > 0:
+            mst = kruskal_mst_modified(infra_graph, weight_key="distance_km", consider_potential_roads=True, debug=True)
+            mst_cost_summary = analyze_mst_cost(mst, infra_graph, cost_attribute="Construction_Cost_Million_EGP")
+            write("\nMinimum Spanning Tree Analysis\n")
+            write("-----------------------------\n")
+            write(f"Number of edges in MST: {mst_cost_summary['edge_count']}\n")
+            write(f"Total construction cost: {mst_cost_summary['total_construction_cost_million_egp']:.2f} M EGP\n")
+            write(f"Total network distance: {mst_cost_summary['total_network_distance_km']:.2f} km\n")
+            if mst_cost_summary["edge_count"] > 0:
+                write("MST Edge Details:\n")
+                for i, edge in enumerate(mst_cost_summary["edge_details"]):
+                    write(f"{i+1}. From {edge['from']} to {edge['to']}:\n")
+                    write(f"   Cost: {edge['cost']:.2f} M EGP\n")
+                    write(f"   Distance: {edge['distance']:.2f} km\n")
+                    write(f"   Type: {edge['type']}\n\n")
+            if mst_cost_summary["isolated_nodes"]:
+                write("Isolated Nodes:\n")
+                for node in sorted(mst_cost_summary["isolated_nodes"]):
+                    write(f"- {node}")
+                    name = infra_graph.nodes[node].get("Name", "")
+                    if name:
+                        write(f" ({name})")
+                    write("\n")
+                write(f"Total isolated nodes: {len(mst_cost_summary['isolated_nodes'])}\n")
+    else:
+        write("Failed to load infrastructure graph for cost analysis.\n")
+
     with open(output_path, 'w') as f:
-        if infra_graph:
-            f.write(f"Infrastructure Analysis Report\n")
-            f.write(f"===========================\n\n")
-            f.write(f"Network Overview:\n")
-            f.write(f"- Total nodes: {infra_graph.number_of_nodes()}\n")
-            f.write(f"- Total edges: {infra_graph.number_of_edges()}\n\n")
-
-            potential_costs_summary = analyze_potential_road_costs(infra_graph)
-            f.write("Potential Road Costs Summary\n")
-            f.write("---------------------------\n")
-            f.write(f"Number of potential road projects: {potential_costs_summary['count']}\n")
-            f.write(f"Total estimated cost: {potential_costs_summary['total_potential_cost_million_egp']:.2f} M EGP\n")
-            f.write(f"Average cost per project: {potential_costs_summary['average_potential_cost_million_egp']:.2f} M EGP\n")
-            f.write(f"Total distance of potential roads: {potential_costs_summary['total_potential_distance_km']:.2f} km\n")
-            f.write(f"Average distance per road: {potential_costs_summary['average_potential_distance_km']:.2f} km\n\n")
-
-            if potential_costs_summary["count"] > 0:
-                f.write("Top 3 Most Expensive Potential Roads:\n")
-                for i, road in enumerate(potential_costs_summary["potential_roads_list"][:3]):
-                    f.write(f"{i+1}. From {road['from']} to {road['to']}:\n")
-                    f.write(f"   Cost: {road['cost_million_egp']:.2f} M EGP\n")
-                    f.write(f"   Distance: {road['distance_km']:.2f} km\n")
-                    f.write(f"   Estimated Capacity: {road['estimated_capacity']} vehicles/hour\n\n")
-
-            if infra_graph.number_of_edges() > 0:
-                mst = kruskal_mst_modified(infra_graph, weight_key="distance_km", consider_potential_roads=True)
-                mst_cost_summary = analyze_mst_cost(mst, infra_graph, cost_attribute="Construction_Cost_Million_EGP")
-                f.write("\nMinimum Spanning Tree Analysis\n")
-                f.write("-----------------------------\n")
-                f.write(f"Number of edges in MST: {mst_cost_summary['edge_count']}\n")
-                f.write(f"Total construction cost: {mst_cost_summary['total_construction_cost_million_egp']:.2f} M EGP\n")
-                f.write(f"Total network distance: {mst_cost_summary['total_network_distance_km']:.2f} km\n")
-                if mst_cost_summary["edge_count"] > 0:
-                    f.write("MST Edge Details:\n")
-                    for i, edge in enumerate(mst_cost_summary["edge_details"]):
-                        f.write(f"{i+1}. From {edge['from']} to {edge['to']}:\n")
-                        f.write(f"   Cost: {edge['cost']:.2f} M EGP\n")
-                        f.write(f"   Distance: {edge['distance']:.2f} km\n")
-                        f.write(f"   Type: {edge['type']}\n\n")
-                if mst_cost_summary["isolated_nodes"]:
-                    f.write("Isolated Nodes:\n")
-                    for node in sorted(mst_cost_summary["isolated_nodes"]):
-                        f.write(f"- {node}")
-                        name = infra_graph.nodes[node].get("Name", "")
-                        if name:
-                            f.write(f" ({name})")
-                        f.write("\n")
-                    f.write(f"Total isolated nodes: {len(mst_cost_summary['isolated_nodes'])}\n")
-        else:
-            f.write("Failed to load infrastructure graph for cost analysis.\n")
+        f.write("".join(report))
+
+    if infra_graph:
+        # Structured copy of the summaries for the dashboard (app2.py), so it doesn't parse the text report
+        with open(summary_json_path, 'w') as f:
+            json.dump({
+                "potential_road_costs": potential_costs_summary,
+                "mst": mst_cost_summary if infra_graph.number_of_edges() > 0 else None
+            }, f, indent=4, default=str)
 
-    print(f"Cost analysis results have been saved to {output_path}")
\ No newline at end of file
+    print(f"Cost analysis results have been saved to {output_path} and {summary_json_path}")
\ No newline at end of file
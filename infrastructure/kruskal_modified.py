@@ -1,17 +1,30 @@
 import json
 import networkx as nx
-import heapq
+import numpy as np
 
-# --- Data Loading ---
+try:
+    import orjson
+except ImportError:  # fall back to the standard library parser
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:  # kruskal_select runs as plain Python over lists
+    njit = None
+
+# --- Data Loading (shared with cost_analysis) ---
 def load_json_data(file_path):
     """Loads data from a JSON file."""
     try:
+        if orjson is not None:
+            with open(file_path, "rb") as f:
+                return orjson.loads(f.read())
         with open(file_path, "r") as f:
             return json.load(f)
     except FileNotFoundError:
         print(f"Error: Data file not found at {file_path}")
         return None
-    except json.JSONDecodeError:
+    except ValueError: # json.JSONDecodeError and orjson.JSONDecodeError
         print(f"Error: Could not decode JSON from {file_path}")
         return None
 
@@ -39,14 +52,12 @@ def get_infrastructure_graph(road_data_path, facilities_data_path):
                 graph.nodes[facility_id].update(facility_info)
 
     if "edges" in road_data:
-        seen_edges = set()
         for edge_info in road_data["edges"]:
             u, v = str(edge_info["FromID"]), str(edge_info["ToID"])
-            edge_key = tuple(sorted([u, v]))
-            if edge_key in seen_edges:
+            # The graph is undirected, so this also catches the same road listed in the other direction
+            if graph.has_edge(u, v):
                 print(f"Warning: Duplicate edge found between {u} and {v}, ignoring duplicate")
                 continue
-            seen_edges.add(edge_key)
 
             attributes = {}
             if edge_info.get("status") == "existing":
@@ -67,10 +78,55 @@ def get_infrastructure_graph(road_data_path, facilities_data_path):
     return graph
 
 # --- Kruskal's Algorithm (Modified) ---
+def kruskal_select(edge_u, edge_v, order, parent, rank, max_edges):
+    """
+    Kruskal's accept/reject pass over integer endpoints, taking edges in the given order.
+    Union-find with path halving and union by rank over the parent/rank arrays (modified in place).
+    Returns the indices of the accepted edges, at most max_edges of them, in acceptance order.
+    """
+    accepted = np.empty(max_edges, dtype=np.int64)
+    count = 0
+    for k in order:
+        if count == max_edges:
+            break
+        x = edge_u[k]
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        y = edge_v[k]
+        while parent[y] != y:
+            parent[y] = parent[parent[y]]
+            y = parent[y]
+        if x != y:
+            if rank[x] < rank[y]:
+                x, y = y, x
+            parent[y] = x
+            if rank[x] == rank[y]:
+                rank[x] += 1
+            accepted[count] = k
+            count += 1
+    return accepted[:count]
+
+if njit is not None:
+    kruskal_select = njit(cache=True)(kruskal_select)
+    # Compile now so the first MST doesn't pay the JIT latency
+    kruskal_select(np.array([0], dtype=np.int64), np.array([1], dtype=np.int64), np.array([0], dtype=np.int64),
+                   np.arange(2, dtype=np.int64), np.zeros(2, dtype=np.int64), 1)
+
+def run_kruskal_select(edge_u, edge_v, order, num_nodes, max_edges):
+    """Accepted edge indices (a list) from kruskal_select on fresh union-find state: NumPy arrays
+    for the compiled kernel, lists for plain Python, where list indexing is much cheaper."""
+    if njit is not None:
+        return kruskal_select(edge_u, edge_v, order, np.arange(num_nodes, dtype=np.int64),
+                              np.zeros(num_nodes, dtype=np.int64), max_edges).tolist()
+    return kruskal_select(edge_u.tolist(), edge_v.tolist(), order.tolist(), list(range(num_nodes)),
+                          [0] * num_nodes, max_edges).tolist()
+
 def kruskal_mst_modified(graph, weight_key="distance_km", consider_potential_roads=False,
                          critical_facility_ids=None, high_population_threshold=100000,
-                         population_weight_factor=0.1):
-    """Finds a Minimum Spanning Tree using Kruskal's algorithm with modifications."""
+                         population_weight_factor=0.1, debug=False):
+    """Finds a Minimum Spanning Tree using Kruskal's algorithm with modifications.
+    With debug=True the connected components of the input graph are listed first."""
     if graph is None:
         return nx.Graph()
 
@@ -78,33 +134,43 @@ def kruskal_mst_modified(graph, weight_key="distance_km", consider_potential_roa
     mst.add_nodes_from(graph.nodes(data=True))
 
     # Print graph edge composition before filtering
-    existing_count = sum(1 for _, _, d in graph.edges(data=True) if d.get("type") == "existing_road")
-    potential_count = sum(1 for _, _, d in graph.edges(data=True) if d.get("type") == "potential_road")
+    road_types = list(nx.get_edge_attributes(graph, "type").values())
+    existing_count = road_types.count("existing_road")
+    potential_count = road_types.count("potential_road")
     print(f"\nInitial graph composition:")
     print(f"- Existing roads: {existing_count}")
     print(f"- Potential roads: {potential_count}")
     print(f"- Total edges: {graph.number_of_edges()}")
     print(f"Consider potential roads: {consider_potential_roads}")
 
-    components = list(nx.connected_components(graph))
-    print(f"Number of connected components: {len(components)}")
-    for i, component in enumerate(components):
-        print(f"Component {i+1} has {len(component)} nodes: {', '.join(sorted(component))}")
+    if debug:
+        components = list(nx.connected_components(graph))
+        print(f"Number of connected components: {len(components)}")
+        for i, component in enumerate(components):
+            print(f"Component {i+1} has {len(component)} nodes: {', '.join(sorted(component))}")
 
-    edges = []
+    # Node ids are numbered in sorted order, so equal-weight edges are taken in node-name order
+    nodes = sorted(graph.nodes())
+    id_of = {node: i for i, node in enumerate(nodes)}
+    # Per-node lookups hoisted out of the edge loop, indexed by node id
+    critical = frozenset(critical_facility_ids or ())
+    is_critical = np.fromiter((node in critical for node in nodes), dtype=bool, count=len(nodes))
+    population = np.fromiter((graph.nodes[node].get("Population", 0) for node in nodes), dtype=np.float64, count=len(nodes))
+    # Per-edge inputs gathered in one pass (one list per field); the weights are then computed for all edges at once
+    edge_u, edge_v, base_weights, cost_penalties, edge_data = [], [], [], [], []
     filtered_edges = 0
     added_edges = 0
     for u, v, data in graph.edges(data=True):
-        if not consider_potential_roads and data.get("type") == "potential_road":
+        road_type = data.get("type")
+        if not consider_potential_roads and road_type == "potential_road":
             filtered_edges += 1
             continue
         
         added_edges += 1
-        road_type = data.get("type", "unknown")
 
         # Handle weight based on the weight_key
         if weight_key == "cost_million_egp":
-            if data.get("type") == "existing_road":
+            if road_type == "existing_road":
                 # Add a small distance-based penalty to existing roads to balance with potential roads
                 original_weight = 0.0 + (float(data.get("distance_km", 0)) * 0.1)  # Small penalty: 0.1 * distance
             else:
@@ -118,53 +184,49 @@ def kruskal_mst_modified(graph, weight_key="distance_km", consider_potential_roa
                 continue
             original_weight = float(data[weight_key])
 
-        modified_weight = original_weight
-        if data.get("type") == "potential_road" and weight_key == "distance_km" and "cost_million_egp" in data:
+        cost_penalty = 0.0
+        if road_type == "potential_road" and weight_key == "distance_km" and "cost_million_egp" in data:
             cost_penalty = data["cost_million_egp"] / 100
-            modified_weight = original_weight * (1 + cost_penalty)
-            print(f"Potential road {u}-{v}: original weight={original_weight:.2f}, cost penalty={cost_penalty:.2f}, modified={modified_weight:.2f}")
-
-        priority_multiplier = 1.0
-        if critical_facility_ids and (u in critical_facility_ids or v in critical_facility_ids):
-            priority_multiplier *= 0.8
-        u_pop = graph.nodes[u].get("Population", 0)
-        v_pop = graph.nodes[v].get("Population", 0)
-        max_pop = max(u_pop, v_pop)
-        if max_pop > high_population_threshold and high_population_threshold > 0:
-            pop_factor = min(1.5, max_pop / high_population_threshold)
-            priority_multiplier *= (1 - (population_weight_factor * (pop_factor - 1)))
-
-        modified_weight *= priority_multiplier
-        heapq.heappush(edges, (modified_weight, u, v, data))
+
+        edge_u.append(id_of[u])
+        edge_v.append(id_of[v])
+        base_weights.append(original_weight)
+        cost_penalties.append(cost_penalty)
+        edge_data.append(data)
+
+    edge_u = np.array(edge_u, dtype=np.int64)
+    edge_v = np.array(edge_v, dtype=np.int64)
+    base_weights = np.array(base_weights, dtype=np.float64)
+    cost_penalties = np.array(cost_penalties, dtype=np.float64)
+    weights = base_weights * (1 + cost_penalties)
+    for k in np.flatnonzero(cost_penalties).tolist():
+        print(f"Potential road {nodes[edge_u[k]]}-{nodes[edge_v[k]]}: original weight={base_weights[k]:.2f}, cost penalty={cost_penalties[k]:.2f}, modified={weights[k]:.2f}")
+
+    # Priority multipliers: critical facility endpoints, then highly populated endpoints
+    priority_multiplier = np.where(is_critical[edge_u] | is_critical[edge_v], 0.8, 1.0)
+    if high_population_threshold > 0:
+        max_pop = np.maximum(population[edge_u], population[edge_v])
+        pop_factor = np.minimum(1.5, max_pop / high_population_threshold)
+        priority_multiplier *= np.where(max_pop > high_population_threshold,
+                                        1 - (population_weight_factor * (pop_factor - 1)), 1.0)
+    weights *= priority_multiplier
     
     print(f"\nEdge filtering summary:")
     print(f"- Filtered edges: {filtered_edges}")
-    print(f"- Added to heap: {added_edges}")
+    print(f"- Added to edge list: {added_edges}")
     print(f"- Total processed: {filtered_edges + added_edges}")
 
-    parent = {node: node for node in graph.nodes()}
-    def find_set(node):
-        if parent[node] != node:
-            parent[node] = find_set(parent[node])
-        return parent[node]
-
-    def unite_sets(u_set, v_set):
-        parent[u_set] = v_set
-
-    num_edges_in_mst = 0
     target_num_edges = graph.number_of_nodes() - 1
     if graph.number_of_nodes() == 0:
         return mst
 
-    while edges and num_edges_in_mst < target_num_edges:
-        weight, u, v, edge_data = heapq.heappop(edges)
-        u_set, v_set = find_set(u), find_set(v)
-        if u_set != v_set:
-            mst.add_edge(u, v, **edge_data, modified_weight=weight, original_weight=edge_data.get(weight_key, 0.0))
-            unite_sets(u_set, v_set)
-            num_edges_in_mst += 1
-            if not nx.is_connected(mst) and num_edges_in_mst == target_num_edges:
-                break
+    # Take candidate edges in non-decreasing weight order (ties broken by node ids, which follow node-name order)
+    order = np.lexsort((edge_v, edge_u, weights))
+    accepted = run_kruskal_select(edge_u, edge_v, order, len(nodes), target_num_edges)
+    for k in accepted:
+        u, v, weight, data = nodes[edge_u[k]], nodes[edge_v[k]], float(weights[k]), edge_data[k]
+        mst.add_edge(u, v, **data, modified_weight=weight, original_weight=data.get(weight_key, 0.0))
+    num_edges_in_mst = len(accepted)
 
     print(f"MST edges added: {num_edges_in_mst}")
     return mst
@@ -181,7 +243,7 @@ if __name__ == "__main__":
         print(f"Infrastructure graph loaded: {infra_graph.number_of_nodes()} nodes, {infra_graph.number_of_edges()} edges")
 
         # Test 1: Basic MST with distance on existing roads
-        mst1 = kruskal_mst_modified(infra_graph, weight_key="distance_km", consider_potential_roads=False)
+        mst1 = kruskal_mst_modified(infra_graph, weight_key="distance_km", consider_potential_roads=False, debug=True)
         if mst1.edges():
             total_dist1 = sum(d["distance_km"] for u, v, d in mst1.edges(data=True))
             print(f"MST 1 (Distance, Existing): {mst1.number_of_edges()} edges, Total Distance: {total_dist1:.2f} km")
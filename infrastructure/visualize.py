@@ -1,57 +1,43 @@
-import json
 import networkx as nx
 import matplotlib.pyplot as plt
 import folium
 from folium import plugins
 import os
 import streamlit as st
-from kruskal_modified import get_infrastructure_graph, kruskal_mst_modified
+from kruskal_modified import load_json_data, get_infrastructure_graph, kruskal_mst_modified
 
 def log_debug(message, filepath="debug_log.txt"):
     """Helper function to log debug messages."""
     with open(filepath, "a") as f:
         f.write(message + "\n")
 
-# --- Shared Data Loading ---
-def load_json_data(file_path):
-    """Loads data from a JSON file."""
-    try:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Data file not found at {file_path}")
-        return None
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from {file_path}")
-        return None
-
 # --- Visualization Functions ---
 def visualize_network_on_map(graph, mst=None):
     """Creates an interactive map visualization of the network."""
-    # Find center coordinates for the map
-    lats = []
-    lons = []
+    # Parse node coordinates once; edges are only drawn between nodes that have both coordinates
+    positions = []
+    coords = {}
     for node, data in graph.nodes(data=True):
         try:
             # Assuming coordinates are in latitude/longitude format
             lat = float(data.get("Y_coordinate", 0))
             lon = float(data.get("X_coordinate", 0))
-            lats.append(lat)
-            lons.append(lon)
         except (ValueError, TypeError):
             continue
+        positions.append((node, lat, lon))
+        if "Y_coordinate" in data and "X_coordinate" in data:
+            coords[node] = [lat, lon]
 
-    center_lat = sum(lats) / len(lats) if lats else 30.0444  # Default to Cairo coordinates
-    center_lon = sum(lons) / len(lons) if lons else 31.2357
+    # Find center coordinates for the map
+    center_lat = sum(lat for _, lat, _ in positions) / len(positions) if positions else 30.0444  # Default to Cairo coordinates
+    center_lon = sum(lon for _, _, lon in positions) / len(positions) if positions else 31.2357
 
     # Create a map centered on the network
     m = folium.Map(location=[center_lat, center_lon], zoom_start=12)
 
     # Add nodes
-    for node, data in graph.nodes(data=True):
+    for node, lat, lon in positions:
         try:
-            lat = float(data.get("Y_coordinate", 0))
-            lon = float(data.get("X_coordinate", 0))
             color = "green" if node.startswith("F") else "blue"
             folium.CircleMarker(
                 location=[lat, lon],
@@ -68,43 +54,36 @@ def visualize_network_on_map(graph, mst=None):
     if mst:
         # Draw MST edges
         for u, v, data in mst.edges(data=True):
+            if u not in coords or v not in coords:
+                continue
             try:
-                u_lat = float(graph.nodes[u]["Y_coordinate"])
-                u_lon = float(graph.nodes[u]["X_coordinate"])
-                v_lat = float(graph.nodes[v]["Y_coordinate"])
-                v_lon = float(graph.nodes[v]["X_coordinate"])
-                
                 color = "red" if data.get("type") == "existing_road" else "blue"
                 weight = 4
                 
                 folium.PolyLine(
-                    locations=[[u_lat, u_lon], [v_lat, v_lon]],
+                    locations=[coords[u], coords[v]],
                     weight=weight,
                     color=color,
                     opacity=0.8,
                     popup=f"Road: {u} to {v}"
                 ).add_to(m)
-            except (ValueError, TypeError, KeyError):
+            except (ValueError, TypeError):
                 continue
 
         # Draw non-MST edges as gray dashed lines
         for u, v in graph.edges():
-            if not mst.has_edge(u, v):
-                try:
-                    u_lat = float(graph.nodes[u]["Y_coordinate"])
-                    u_lon = float(graph.nodes[u]["X_coordinate"])
-                    v_lat = float(graph.nodes[v]["Y_coordinate"])
-                    v_lon = float(graph.nodes[v]["X_coordinate"])
-                    
-                    folium.PolyLine(
-                        locations=[[u_lat, u_lon], [v_lat, v_lon]],
-                        weight=2,
-                        color='gray',
-                        opacity=0.4,
-                        dash_array='5, 5'
-                    ).add_to(m)
-                except (ValueError, TypeError, KeyError):
-                    continue
+            if mst.has_edge(u, v) or u not in coords or v not in coords:
+                continue
+            try:
+                folium.PolyLine(
+                    locations=[coords[u], coords[v]],
+                    weight=2,
+                    color='gray',
+                    opacity=0.4,
+                    dash_array='5, 5'
+                ).add_to(m)
+            except (ValueError, TypeError):
+                continue
 
     # Add a fullscreen button
     plugins.Fullscreen().add_to(m)
@@ -153,7 +132,7 @@ def main():
         log_debug(f"- Potential roads: {potential_count}")
 
         # Find isolated nodes
-        isolated_nodes = [node for node in infra_graph.nodes() if infra_graph.degree(node) == 0]
+        isolated_nodes = list(nx.isolates(infra_graph))
         if isolated_nodes:
             log_debug("\nFound isolated nodes:")
             for node in isolated_nodes:
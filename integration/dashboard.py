@@ -14,12 +14,32 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from system_manager import SystemManager
+from system_manager import SystemManager, DATA_BASE_PATH
 from traffic_flow.congestion_analysis import calculate_congestion_levels, identify_bottlenecks, visualize_congestion_map
 
+DATA_FILES = ["road_data.json", "facilities.json", "traffic_data.json", "transit_data.json"]
+
+def _data_version():
+    """Modification times of the data files (None for a missing one), used to key the cache below."""
+    versions = []
+    for name in DATA_FILES:
+        try:
+            versions.append(os.path.getmtime(os.path.join(DATA_BASE_PATH, name)))
+        except OSError:
+            versions.append(None)
+    return tuple(versions)
+
+@st.cache_resource(show_spinner=False)
+def load_system_manager(data_version):
+    """
+    Loads all graphs and data once per data version, shared by every session. The manager's graphs are
+    only read by its methods; the one cache they fill (astar_emergency's effective weights) is locked.
+    """
+    return SystemManager()
+
 # Initialize session state
 if 'system_manager' not in st.session_state:
-    st.session_state['system_manager'] = SystemManager()
+    st.session_state['system_manager'] = load_system_manager(_data_version())
 
 # Page configuration
 st.set_page_config(
@@ -52,7 +72,8 @@ def overview_page():
     with col2:
         st.subheader("Quick Actions")
         if st.button("Refresh Data"):
-            st.session_state.system_manager._load_all_graphs_and_data()
+            load_system_manager.clear()
+            st.session_state['system_manager'] = load_system_manager(_data_version())
             st.success("Data refreshed successfully!")
 
 def infrastructure_page():